@@ -1,29 +1,59 @@
 import json
+from functools import partial, update_wrapper
 from urllib.parse import urlencode
 
+import django
 from django.conf import settings
 from django.contrib.admin import ModelAdmin, TabularInline, StackedInline
 from django.contrib.admin.options import InlineModelAdmin
 from django.contrib.admin.views.main import IGNORED_PARAMS, PAGE_VAR
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.contenttypes.admin import (GenericStackedInline,
                                                GenericTabularInline)
 from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import PermissionDenied
-from django.db import transaction
-from django.http import JsonResponse
+from django.core.exceptions import (EmptyResultSet, ImproperlyConfigured,
+                                    ObjectDoesNotExist, PermissionDenied,
+                                    ValidationError)
+from django.core.paginator import Paginator
+from django.db import router, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import render
 from django.template.defaultfilters import capfirst
-from django.urls import re_path
+from django.template.loader import render_to_string
+from django.urls import re_path, reverse
 from django.utils.decorators import method_decorator
-from django.utils.translation import gettext as _
+from django.utils.cache import add_never_cache_headers
+from django.utils.safestring import mark_safe
+from django.utils.translation import gettext as _, get_language
+from django.middleware.csrf import CsrfViewMiddleware
 from django.views.decorators.http import require_POST
 
-from adminsortable.fields import SortableForeignKey
 from adminsortable.models import SortableMixin
-from adminsortable.utils import get_is_sortable
+from adminsortable.options import get_sortable_options
+from adminsortable.ordering import (GroupOrderVersions, ReorderConflict,
+                                    bump_order_version, get_contiguous_order,
+                                    get_group_filters, get_order_field_range,
+                                    get_order_version, get_sparse_order,
+                                    has_reorder_receivers, move_object,
+                                    retry_on_lock_failure,
+                                    send_reorder_signals, write_order)
+from adminsortable.signals import post_reorder
+from adminsortable.timing import get_request_timer, timed_view
+from adminsortable.utils import (bump_model_version, get_cache,
+                                 get_is_sortable, get_model_version,
+                                 get_queryset_cache_key)
+
+if django.VERSION >= (4, 1):
+    # only needed by the async views, and not a dependency of older Django
+    from asgiref.sync import sync_to_async
 
 STATIC_URL = settings.STATIC_URL
 
+# the querystring parameter selecting the parent whose objects are listed
+PARENT_VAR = '_parent'
+
 
 class SortableAdminBase(object):
     sortable_change_list_with_sort_link_template = \
@@ -36,21 +66,85 @@ class SortableAdminBase(object):
 
     after_sorting_js_callback_name = None
 
+    # seconds to cache whether a list has enough objects to be sorted, until
+    # an object of the model is saved or deleted
+    sortable_cache_timeout = None
+
+    # record how long the phases of the sortable views take, in a
+    # Server-Timing header and the `adminsortable` logger
+    sortable_timing = False
+
+    # log a warning when a sortable view runs more queries than this
+    sortable_query_budget = None
+
+    def __init__(self, *args, **kwargs):
+        super(SortableAdminBase, self).__init__(*args, **kwargs)
+
+        if self.sortable_cache_timeout is not None:
+            self.connect_version_signals(self.model)
+
+    def connect_version_signals(self, model):
+        """
+        Invalidate the values cached for `model` whenever one of its objects
+        is saved, deleted or reordered, e.g. by `move_object`.
+        """
+        dispatch_uid = 'adminsortable_version_{0}'.format(
+            model._meta.label_lower)
+        post_save.connect(bump_model_version, sender=model,
+            dispatch_uid=dispatch_uid)
+        post_delete.connect(bump_model_version, sender=model,
+            dispatch_uid=dispatch_uid)
+        post_reorder.connect(bump_model_version, sender=model,
+            dispatch_uid=dispatch_uid)
+
+    def get_is_sortable(self, request, queryset):
+        """
+        Return whether `queryset` has at least two objects. The answer is
+        kept for the rest of the request and, when `sortable_cache_timeout`
+        is set, in the cache until an object of the model changes.
+        """
+        try:
+            key = get_queryset_cache_key('is_sortable', queryset)
+        except EmptyResultSet:
+            return False
+
+        request_cache = request.__dict__.setdefault(
+            '_adminsortable_is_sortable', {})
+        if key in request_cache:
+            return request_cache[key]
+
+        if self.sortable_cache_timeout is None:
+            is_sortable = get_is_sortable(queryset)
+        else:
+            cache = get_cache()
+            key_with_version = '{0}:{1}'.format(key,
+                get_model_version(queryset.model))
+            is_sortable = cache.get(key_with_version)
+            if is_sortable is None:
+                is_sortable = get_is_sortable(queryset)
+                cache.set(key_with_version, is_sortable,
+                    self.sortable_cache_timeout)
+
+        request_cache[key] = is_sortable
+        return is_sortable
+
     def get_querystring_filters(self, request):
         filters = {}
 
         for k, v in request.GET.items():
-            if k not in IGNORED_PARAMS and k != PAGE_VAR:
+            if k not in IGNORED_PARAMS and k not in (PAGE_VAR, PARENT_VAR):
                 filters[k] = v
 
         return filters
 
+    @timed_view
     def changelist_view(self, request, extra_context=None):
         """
         If the model that inherits Sortable has more than one object,
         its sort order can be changed. This view adds a link to the
         object_tools block to take people to the view to change the sorting.
         """
+        timer = get_request_timer(request)
 
         # apply any filters via the querystring
         filters = self.get_querystring_filters(request)
@@ -60,10 +154,11 @@ class SortableAdminBase(object):
         queryset = self.get_queryset(request).filter(**filters)
         self.is_sortable = False
 
-        if get_is_sortable(queryset):
+        if self.get_is_sortable(request, queryset):
             self.change_list_template = \
                 self.sortable_change_list_with_sort_link_template
             self.is_sortable = True
+        timer.lap('sortable')
 
         if extra_context is None:
             extra_context = {}
@@ -75,8 +170,10 @@ class SortableAdminBase(object):
             'is_sortable': self.is_sortable
         })
 
-        return super(SortableAdminBase, self).changelist_view(request,
+        response = super(SortableAdminBase, self).changelist_view(request,
             extra_context=extra_context)
+        timer.lap('changelist')
+        return response
 
     # override this function in your SortableAdmin if you need to do something
     # after sorting has occurred
@@ -88,11 +185,67 @@ class SortableAdmin(SortableAdminBase, ModelAdmin):
     """
     Admin class to add template overrides and context objects to enable
     drag-and-drop ordering.
+
+    `sort_view_paginate_threshold` paginates the sort view once it would
+    list more objects than the threshold, showing `sort_view_per_page`
+    objects per page. Objects can be moved to the neighbouring pages by
+    dropping them on the "previous page" and "next page" targets.
+
+    `sort_view_select_related` and `sort_view_prefetch_related` list the
+    relations to fetch along with the objects of the sort view, e.g. those
+    used by their `__str__`. The `SortableForeignKey` is always selected.
+
+    `sort_view_cache_timeout` caches the rendered list of the sort view for
+    that many seconds, until the objects (or their parents) are saved,
+    deleted or sorted.
+
+    `sort_view_optimistic` embeds the order version of every list in the
+    sort view, and applies the moves posted with it without locking any
+    rows, answering 409 Conflict with the current order when the list has
+    changed since. Otherwise the rows are locked in primary key order, and
+    a reorder is retried up to `sort_lock_retries` times while they are
+    locked by another one.
+
+    `sortable_async_views` serves the sort view and the `do_sorting` view
+    with async views, for ASGI deployments. It requires Django 4.1 or
+    higher.
+
+    `sort_view_lazy_children` only lists the parents on the sort view of a
+    model with a `SortableForeignKey`, along with the number of their
+    objects, and fetches the objects of a parent when it is expanded.
+
+    `sort_view_compact` renders every object of the sort view as a list
+    item with a `data-pk` attribute, and its list carries the sorting URL,
+    instead of a form with its own sorting URL and CSRF token per object.
     """
 
+    sort_view_per_page = 100
+    sort_view_paginate_threshold = None
+    sort_view_select_related = ()
+    sort_view_prefetch_related = ()
+    sort_view_cache_timeout = None
+    sort_view_optimistic = False
+    sort_lock_retries = 3
+    sortable_async_views = False
+    sort_view_lazy_children = False
+    sort_view_compact = False
+
     class Meta:
         abstract = True
 
+    def __init__(self, *args, **kwargs):
+        super(SortableAdmin, self).__init__(*args, **kwargs)
+
+        if self.sortable_async_views and django.VERSION < (4, 1):
+            raise ImproperlyConfigured(u'`sortable_async_views` requires '
+                'Django 4.1 or higher.')
+
+        if self.sort_view_cache_timeout is not None:
+            self.connect_version_signals(self.model)
+            field = get_sortable_options(self.model).sortable_foreign_key
+            if field is not None:
+                self.connect_version_signals(field.remote_field.model)
+
     @property
     def has_sortable_tabular_inlines(self):
         base_classes = (SortableTabularInline, SortableGenericTabularInline)
@@ -113,28 +266,73 @@ class SortableAdmin(SortableAdminBase, ModelAdmin):
         urls = super(SortableAdmin, self).get_urls()
         info = self.model._meta.app_label, self.model._meta.model_name
 
+        if self.sortable_async_views:
+            do_sorting_view = self.async_admin_view(self.async_do_sorting_view)
+            sort_view = self.async_admin_view(self.async_sort_view)
+        else:
+            do_sorting_view = self.admin_site.admin_view(self.do_sorting_view)
+            sort_view = self.admin_site.admin_view(self.sort_view)
+
+        # this view applies several reorders in one transaction
+        admin_do_sorting_batch_url = re_path(
+            r'^sort/do-sorting/batch/$',
+            self.admin_site.admin_view(self.do_sorting_batch_view),
+            name='%s_%s_do_sorting_batch' % info)
+
         # this ajax view changes the order of instances of the model type
         admin_do_sorting_url = re_path(
             r'^sort/do-sorting/(?P<model_type_id>\d+)/$',
-            self.admin_site.admin_view(self.do_sorting_view),
+            do_sorting_view,
             name='%s_%s_do_sorting' % info)
 
         # this view displays the sortable objects
         admin_sort_url = re_path(
             r'^sort/$',
-            self.admin_site.admin_view(self.sort_view),
+            sort_view,
             name='%s_%s_sort' % info)
 
+        # this ajax view displays the sortable objects of one parent
+        admin_sort_children_url = re_path(
+            r'^sort/children/$',
+            self.admin_site.admin_view(self.sort_children_view),
+            name='%s_%s_sort_children' % info)
+
         urls = [
+            admin_do_sorting_batch_url,
             admin_do_sorting_url,
-            admin_sort_url
+            admin_sort_url,
+            admin_sort_children_url
         ] + urls
         return urls
 
-    def get_sort_view_queryset(self, request, sortable_by_expression):
+    def async_admin_view(self, view):
         """
-        Return a queryset, optionally filtered based on request and
-        `sortable_by_expression` to be used in the sort view.
+        Async counterpart of `AdminSite.admin_view`, which can't wrap async
+        views before Django 5.0: redirect to the login page unless the user
+        may use the admin, check the CSRF token of unsafe requests, as
+        `csrf_protect` would, and prevent the response from being cached.
+        """
+        csrf_middleware = CsrfViewMiddleware(view)
+
+        async def inner(request, *args, **kwargs):
+            if not await sync_to_async(self.admin_site.has_permission)(request):
+                return redirect_to_login(request.get_full_path(),
+                    reverse('admin:login', current_app=self.admin_site.name))
+            response = await sync_to_async(csrf_middleware.process_view)(
+                request, view, args, kwargs)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            response = await sync_to_async(csrf_middleware.process_response)(
+                request, response)
+            add_never_cache_headers(response)
+            return response
+        return update_wrapper(inner, view)
+
+    def get_sort_view_filters(self, request):
+        """
+        Return the filters that select the subset of objects being sorted,
+        either from the querystring or from `sorting_filters` when a
+        `sort_filter` index is present.
         """
         # get sort group index from querystring if present
         sort_filter_index = request.GET.get('sort_filter')
@@ -148,9 +346,72 @@ class SortableAdmin(SortableAdminBase, ModelAdmin):
             except (IndexError, ValueError):
                 pass
 
+        return filters
+
+    def get_sort_view_queryset(self, request, sortable_by_expression):
+        """
+        Return a queryset, optionally filtered based on request and
+        `sortable_by_expression` to be used in the sort view.
+        """
         # Apply any sort filters to create a subset of sortable objects
-        return self.get_queryset(request).filter(**filters)
+        queryset = self.get_queryset(request).filter(
+            **self.get_sort_view_filters(request))
+
+        # objects are regrouped by their SortableForeignKey, so fetch the
+        # parents along with them instead of one query per object
+        select_related = list(self.sort_view_select_related)
+        field = get_sortable_options(self.model).sortable_foreign_key
+        if field is not None and sortable_by_expression == field.name.lower():
+            select_related.append(field.name)
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if self.sort_view_prefetch_related:
+            queryset = queryset.prefetch_related(
+                *self.sort_view_prefetch_related)
+        return queryset
+
+    def get_sort_view_parents(self, objects):
+        """
+        Return the parents of `objects` along the model's
+        `SortableForeignKey`, with the number of their objects in
+        `sortable_children_count`, counted in the same query.
+        """
+        field = get_sortable_options(self.model).sortable_foreign_key
+        counts = objects.filter(**{
+            field.attname: OuterRef(field.remote_field.field_name)
+        }).order_by().values(field.attname).annotate(
+            count=Count('pk')).values('count')
+        return field.remote_field.model.objects.annotate(
+            sortable_children_count=Subquery(counts,
+                output_field=IntegerField())).filter(
+            sortable_children_count__gt=0)
+
+    def get_sorting_url(self, model):
+        """
+        Return the URL of the view that changes the order of `model`'s
+        objects from this admin.
+        """
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return reverse('admin:%s_%s_do_sorting' % info,
+            kwargs={'model_type_id': ContentType.objects.get_for_model(model).id},
+            current_app=self.admin_site.name)
 
+    def get_sort_view_cache_key(self, request, objects, sortable_by_class):
+        """
+        Return the key of the rendered list of `objects` in the cache, which
+        changes whenever the objects or their parents change.
+        """
+        versions = [get_model_version(self.model)]
+        if sortable_by_class is not None:
+            versions.append(get_model_version(sortable_by_class))
+        try:
+            return get_queryset_cache_key('sort_view', objects,
+                request.get_full_path(), get_language(), *versions)
+        except EmptyResultSet:
+            return None
+
+    @timed_view
     def sort_view(self, request):
         """
         Custom admin view that displays the objects as a list whose sort
@@ -159,6 +420,33 @@ class SortableAdmin(SortableAdminBase, ModelAdmin):
         if not self.has_change_permission(request):
             raise PermissionDenied
 
+        context = self.get_sort_view_context(request)
+        response = render(request, self.sortable_change_list_template, context)
+        get_request_timer(request).lap('render')
+        return response
+
+    async def async_sort_view(self, request):
+        """
+        Async variant of `sort_view`, used when `sortable_async_views` is
+        set. The objects are fetched with the async ORM instead of while the
+        template is rendered.
+        """
+        if not await sync_to_async(self.has_change_permission)(request):
+            raise PermissionDenied
+
+        context = await sync_to_async(self.get_sort_view_context)(request)
+        if context['sortable_list'] is None:
+            context['objects'] = [obj async for obj in context['objects']]
+        return await sync_to_async(render)(request,
+            self.sortable_change_list_template, context)
+
+    def get_sort_view_context(self, request):
+        """
+        Return the context of the sort view. `sortable_list` holds the
+        rendered list of objects when it was cached.
+        """
+        timer = get_request_timer(request)
+
         opts = self.model._meta
 
         jquery_lib_path = 'admin/js/vendor/jquery/jquery.js'
@@ -174,13 +462,14 @@ class SortableAdmin(SortableAdminBase, ModelAdmin):
         sortable_by_field_name = None
         sortable_by_class_is_sortable = False
 
-        for field in self.model._meta.fields:
-            if isinstance(field, SortableForeignKey):
-                sortable_by_fk = field.remote_field.model
-                sortable_by_field_name = field.name.lower()
-                sortable_by_class_is_sortable = \
-                    isinstance(sortable_by_fk, SortableMixin) and \
-                    sortable_by_fk.objects.count() >= 2
+        sortable_options = get_sortable_options(self.model)
+        field = sortable_options.sortable_foreign_key
+        if field is not None:
+            sortable_by_fk = field.remote_field.model
+            sortable_by_field_name = field.name.lower()
+            sortable_by_class_is_sortable = \
+                issubclass(sortable_by_fk, SortableMixin) and \
+                self.get_is_sortable(request, sortable_by_fk.objects.all())
 
         if sortable_by_property:
             sortable_by_class = self.model.sortable_by
@@ -202,20 +491,83 @@ class SortableAdmin(SortableAdminBase, ModelAdmin):
                 sortable_by_class_display_name = \
                 sortable_by_class_is_sortable = None
 
+        # resolve the sorting URLs once, rather than once per object
+        sorting_url = self.get_sorting_url(self.model)
+        parent_sorting_url = self.get_sorting_url(sortable_by_class) \
+            if sortable_by_class_is_sortable else None
+
+        # several moves, e.g. of the nested lists, are posted together to
+        # the batch view
+        batch_sorting_url = reverse('admin:%s_%s_do_sorting_batch' % (
+            opts.app_label, opts.model_name),
+            current_app=self.admin_site.name)
+
+        # list the parents only, their objects are fetched when expanded
+        lazy_children = self.sort_view_lazy_children and \
+            sortable_by_fk is not None and not sortable_by_property
+        children_sorting_url = reverse('admin:%s_%s_sort_children' % (
+            opts.app_label, opts.model_name),
+            current_app=self.admin_site.name) if lazy_children else None
+
         objects = self.get_sort_view_queryset(request, sortable_by_expression)
 
-        if sortable_by_property or sortable_by_fk:
+        if lazy_children:
+            objects = self.get_sort_view_parents(objects)
+        elif sortable_by_property or sortable_by_fk:
             # Order the objects by the property they are sortable by,
             # then by the order, otherwise the regroup
             # template tag will not show the objects correctly
 
-            try:
-                order_field_name = opts.model._meta.ordering[0]
-            except (AttributeError, IndexError):
-                order_field_name = 'order'
+            order_field_name = sortable_options.order_field_name or 'order'
+            if sortable_options.descending:
+                order_field_name = '-' + order_field_name
 
             objects = objects.order_by(sortable_by_expression, order_field_name)
 
+        cache_key = sortable_list = None
+        if self.sort_view_cache_timeout is not None:
+            cache_key = self.get_sort_view_cache_key(request, objects,
+                sortable_by_class)
+            if cache_key is not None:
+                sortable_list = get_cache().get(cache_key)
+
+        # the versions optimistic moves are posted with, of the whole list
+        # or of every group and of the parents; lists that span several
+        # groups are reordered with row locks instead
+        order_version = order_versions = parent_order_version = None
+        if self.sort_view_optimistic and sortable_list is None:
+            if sortable_by_fk:
+                # with lazy children, the version of a group is sent along
+                # with its objects instead
+                if not lazy_children:
+                    order_versions = GroupOrderVersions(self.model,
+                        field.attname)
+            elif not sortable_by_property and \
+                    not sortable_options.group_fields:
+                order_version = get_order_version(self.model)
+            if sortable_by_class_is_sortable and \
+                    not get_sortable_options(sortable_by_class).group_fields:
+                parent_order_version = get_order_version(sortable_by_class)
+
+        page_obj = previous_page_pk = next_page_pk = None
+        if sortable_list is None and \
+                self.sort_view_paginate_threshold is not None:
+            paginator = Paginator(objects, self.sort_view_per_page)
+            if paginator.count > self.sort_view_paginate_threshold:
+                page_obj = paginator.get_page(request.GET.get(PAGE_VAR))
+
+                if not sortable_by_expression:
+                    # drop targets to move objects to the neighbouring pages
+                    pks = objects.values_list('pk', flat=True)
+                    start, end = page_obj.start_index(), page_obj.end_index()
+                    if page_obj.has_previous():
+                        previous_page_pk = pks[start - 2]
+                    if page_obj.has_next():
+                        next_page_pk = pks[end]
+
+                objects = page_obj.object_list
+        timer.lap('queryset')
+
         try:
             verbose_name_plural = opts.verbose_name_plural.__unicode__()
         except AttributeError:
@@ -225,6 +577,9 @@ class SortableAdmin(SortableAdminBase, ModelAdmin):
 
         filters = urlencode(self.get_querystring_filters(request))
 
+        page_querystring = request.GET.copy()
+        page_querystring.pop(PAGE_VAR, None)
+
         context.update({
             'title': u'Drag and drop {0} to change display order'.format(
                 capfirst(verbose_name_plural)),
@@ -236,12 +591,84 @@ class SortableAdmin(SortableAdminBase, ModelAdmin):
             'sortable_by_class_is_sortable': sortable_by_class_is_sortable,
             'sortable_by_class_display_name': sortable_by_class_display_name,
             'filters': filters,
+            'sorting_url': sorting_url,
+            'parent_sorting_url': parent_sorting_url,
+            'batch_sorting_url': batch_sorting_url,
+            'lazy_children': lazy_children,
+            'compact': self.sort_view_compact,
+            'children_sorting_url': children_sorting_url,
+            'order_version': order_version,
+            'order_versions': order_versions,
+            'parent_order_version': parent_order_version,
+            'model_type_id': ContentType.objects.get_for_model(self.model).id,
+            'parent_model_type_id': ContentType.objects.get_for_model(
+                sortable_by_class).id if sortable_by_class_is_sortable
+                else None,
+            'page_obj': page_obj,
+            'page_var': PAGE_VAR,
+            'page_querystring': page_querystring.urlencode(),
+            'previous_page_pk': previous_page_pk,
+            'next_page_pk': next_page_pk,
             'jquery_lib_path': jquery_lib_path,
             'csrf_cookie_name': getattr(settings, 'CSRF_COOKIE_NAME', 'csrftoken'),
             'csrf_header_name': getattr(settings, 'CSRF_HEADER_NAME', 'X-CSRFToken'),
             'after_sorting_js_callback_name': self.after_sorting_js_callback_name
         })
-        return render(request, self.sortable_change_list_template, context)
+
+        if cache_key is not None and sortable_list is None:
+            # the CSRF token is read from the page, keep it out of the cache
+            sortable_list = render_to_string(
+                'adminsortable/shared/sortable_list.html',
+                dict(context, csrf_token='NOTPROVIDED'), request=request)
+            get_cache().set(cache_key, sortable_list,
+                self.sort_view_cache_timeout)
+            timer.lap('sortable_list')
+
+        context['sortable_list'] = mark_safe(sortable_list) \
+            if sortable_list is not None else None
+        return context
+
+    @timed_view
+    def sort_children_view(self, request):
+        """
+        This view returns the objects of the parent in the `_parent`
+        querystring parameter, for the sort view of a model with a
+        `SortableForeignKey` and `sort_view_lazy_children`, as JSON: the
+        rendered list items in `html` and, with `sort_view_optimistic`, the
+        order version of the group in `version`.
+        """
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        options = get_sortable_options(self.model)
+        field = options.sortable_foreign_key
+        if field is None or PARENT_VAR not in request.GET:
+            raise Http404
+        parent = request.GET[PARENT_VAR]
+        order_field_name = options.order_field_name
+
+        try:
+            objects = list(self.get_sort_view_queryset(request, None)
+                .filter(**{field.attname: parent})
+                .order_by(('-' if options.descending else '')
+                    + order_field_name, 'pk'))
+            version = None
+            if self.sort_view_optimistic:
+                version = get_order_version(self.model,
+                    {field.attname: parent})
+        except (ValidationError, ValueError, TypeError):
+            return JsonResponse({'objects_sorted': False,
+                'reason': _("The objects could not be found.")}, status=400)
+        get_request_timer(request).lap('queryset')
+
+        html = render_to_string('adminsortable/shared/list_items.html', {
+            'opts': self.model._meta,
+            'list_objects': objects,
+            'compact': self.sort_view_compact,
+            'sorting_url': self.get_sorting_url(self.model),
+            'filters': urlencode(self.get_querystring_filters(request)),
+        }, request=request)
+        return JsonResponse({'html': html, 'version': version})
 
     def add_view(self, request, form_url='', extra_context=None):
         if extra_context is None:
@@ -270,69 +697,294 @@ class SortableAdmin(SortableAdminBase, ModelAdmin):
         return super(SortableAdmin, self).change_view(request, object_id,
             form_url='', extra_context=extra_context)
 
+    @timed_view
     @method_decorator(require_POST)
     def do_sorting_view(self, request, model_type_id=None):
         """
         This view sets the ordering of the objects for the model type
         and primary keys passed in. It must be an Ajax POST.
+
+        Either post the complete new order as comma separated primary keys
+        in `indexes`, or move a single object by posting its primary key in
+        `moved` along with the primary key of its new preceding object in
+        `after` (or of its new following object in `before`).
         """
         if not self.has_change_permission(request):
             raise PermissionDenied
 
+        return self.sort_objects(request, model_type_id)
+
+    async def async_do_sorting_view(self, request, model_type_id=None):
+        """
+        Async variant of `do_sorting_view`, used when `sortable_async_views`
+        is set. The objects are sorted by a single `sync_to_async` call, so
+        the whole write runs in one transaction on one thread.
+        """
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        if not await sync_to_async(self.has_change_permission)(request):
+            raise PermissionDenied
+
+        return await sync_to_async(self.sort_objects)(request, model_type_id)
+
+    def sort_objects(self, request, model_type_id):
+        """
+        Change the order of the objects as posted to the `do_sorting` view,
+        and return its response.
+        """
+        timer = get_request_timer(request)
         response = {'objects_sorted': False}
 
         if request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest':
-            klass = ContentType.objects.get(id=model_type_id).model_class()
-
-            indexes = [str(idx) for idx in request.POST.get('indexes', []).split(',')]
-
-            # apply any filters via the querystring
-            filters = self.get_querystring_filters(request)
-
-            filters['pk__in'] = indexes
-
-            # Lock rows that we might update
-            qs = klass.objects.select_for_update().filter(**filters)
-
-            with transaction.atomic():
-                objects_dict = {str(obj.pk): obj for obj in qs}
-                objects_list = [*objects_dict.keys()]
-                if len(indexes) != len(objects_dict):
-                    return JsonResponse({
-                            'objects_sorted': False,
-                            'reason': _("An object has been added or removed "
-                                        "since the last load. Please refresh "
-                                        "the page and try reordering again."),
-                        }, status_code=400)
-                order_field_name = klass._meta.ordering[0]
-
-                if order_field_name.startswith('-'):
-                    order_field_name = order_field_name[1:]
-                    step = -1
-                    start_object = objects_dict[objects_list[-1]]
-
-                else:
-                    step = 1
-                    start_object = objects_dict[objects_list[0]]
-
-                start_index = getattr(start_object, order_field_name,
-                    len(indexes))
-                objects_to_update = []
-                for index in indexes:
-                    obj = objects_dict.get(index)
-                    # perform the update only if the order field has changed
-                    if getattr(obj, order_field_name) != start_index:
-                        setattr(obj, order_field_name, start_index)
-                        objects_to_update.append(obj)
-                    start_index += step
-
-                qs.bulk_update(objects_to_update, [order_field_name])
-                response = {'objects_sorted': True}
+            klass = ContentType.objects.get_for_id(model_type_id).model_class()
+
+            try:
+                version = retry_on_lock_failure(partial(self.reorder,
+                    request, klass, request.POST), self.sort_lock_retries,
+                    using=router.db_for_write(klass))
+            except ReorderConflict as conflict:
+                return self.get_reorder_conflict_response(conflict)
+            except (ObjectDoesNotExist, ValidationError, ValueError):
+                return self.get_reorder_failed_response()
+            response = {'objects_sorted': True}
+            if version is not None:
+                response['version'] = version
+            timer.lap('write')
+
+            if self.sort_view_cache_timeout is not None:
+                # invalidate the cached sort view once the new order is
+                # committed
+                transaction.on_commit(lambda: bump_model_version(klass))
 
         self.after_sorting()
+        timer.lap('after_sorting')
 
         return JsonResponse(response)
 
+    @timed_view
+    @method_decorator(require_POST)
+    def do_sorting_batch_view(self, request):
+        """
+        This view applies several reorders at once, e.g. of the parents and
+        of any number of child groups of the nested sort view, in a single
+        transaction. It must be a JSON POST of
+        `{"reorders": [{"model_type_id": ..., ...}, ...]}`, where every
+        reorder holds either the complete new order of a group in `indexes`
+        or a single move in `moved` and `after` or `before`, like the
+        `do_sorting` view.
+
+        The rows of every reorder are locked up front, model by model in
+        primary key order, so that concurrent batches can't deadlock.
+        """
+        timer = get_request_timer(request)
+        try:
+            reorders = json.loads(request.body.decode('utf-8'))['reorders']
+            if not all(isinstance(reorder, dict) for reorder in reorders):
+                raise TypeError
+            models = [ContentType.objects.get_for_id(int(
+                reorder['model_type_id'])).model_class()
+                for reorder in reorders]
+        except (ValueError, KeyError, TypeError, ContentType.DoesNotExist):
+            return JsonResponse({'objects_sorted': False,
+                'reason': _("The reorders could not be read.")}, status=400)
+
+        for klass in set(models):
+            if not self.has_sorting_permission(request, klass):
+                raise PermissionDenied
+
+        def reorder_all():
+            if not self.sort_view_optimistic:
+                self.lock_reorders(request, models, reorders)
+                timer.lap('lock')
+            return [self.reorder(request, klass, reorder)
+                for klass, reorder in zip(models, reorders)]
+
+        try:
+            versions = retry_on_lock_failure(reorder_all,
+                self.sort_lock_retries,
+                using=router.db_for_write(self.model))
+        except ReorderConflict as conflict:
+            return self.get_reorder_conflict_response(conflict)
+        except (ObjectDoesNotExist, ValidationError, ValueError, TypeError):
+            return self.get_reorder_failed_response()
+        timer.lap('write')
+
+        if self.sort_view_cache_timeout is not None:
+            for klass in set(models):
+                transaction.on_commit(partial(bump_model_version, klass))
+
+        self.after_sorting()
+        timer.lap('after_sorting')
+
+        return JsonResponse({'objects_sorted': True, 'versions': versions})
+
+    def has_sorting_permission(self, request, model):
+        """
+        Return whether the objects of `model` may be reordered through this
+        admin: its own objects, those of its sortable inlines and those of
+        the parent model of its `SortableForeignKey`, each with the change
+        permission of the admin registered for that model, if any.
+        """
+        field = get_sortable_options(self.model).sortable_foreign_key
+        models = [self.model] + [inline.model for inline in self.inlines]
+        if field is not None:
+            models.append(field.remote_field.model)
+        if model not in models or not issubclass(model, SortableMixin):
+            return False
+
+        model_admin = self if model is self.model else \
+            self.admin_site._registry.get(model, self)
+        return model_admin.has_change_permission(request)
+
+    def get_reorder_failed_response(self):
+        return JsonResponse({
+                'objects_sorted': False,
+                'reason': _("An object has been added or removed "
+                            "since the last load. Please refresh "
+                            "the page and try reordering again."),
+            }, status=400)
+
+    def get_reorder_conflict_response(self, conflict):
+        """
+        Return the response to a reorder that conflicted with another one,
+        with the current order and order version of the group, if known.
+        """
+        response = {
+            'objects_sorted': False,
+            'conflict': True,
+            'reason': _("The objects have just been reordered by someone "
+                        "else. Please try reordering again."),
+        }
+        if conflict.queryset is not None:
+            options = get_sortable_options(conflict.queryset.model)
+            order_field_name = options.order_field_name
+            response['order'] = [str(pk) for pk in conflict.queryset.order_by(
+                ('-' if options.descending else '') + order_field_name,
+                'pk').values_list('pk', flat=True)]
+        if conflict.group is not None:
+            response['version'] = get_order_version(conflict.queryset.model,
+                conflict.group)
+        return JsonResponse(response, status=409)
+
+    def get_reorder_filters(self, request, klass):
+        # apply any filters via the querystring; they only describe
+        # the objects of this admin, not those of inlines or parents
+        return dict(self.get_sort_view_filters(request)) \
+            if klass is self.model else {}
+
+    def lock_reorders(self, request, models, reorders):
+        """
+        Lock the rows posted in every reorder, model by model in primary key
+        order.
+        """
+        pks = {}
+        for klass, reorder in zip(models, reorders):
+            pks.setdefault(klass, set()).update(
+                str(pk) for pk in self.get_reorder_pks(reorder))
+        for klass in sorted(pks, key=lambda klass: klass._meta.label_lower):
+            list(klass.objects.filter(pk__in=pks[klass],
+                **self.get_reorder_filters(request, klass)).order_by('pk')
+                .select_for_update(nowait=True).values_list('pk', flat=True))
+
+    def get_reorder_pks(self, reorder):
+        if reorder.get('moved'):
+            return [pk for pk in (reorder['moved'], reorder.get('after'),
+                reorder.get('before')) if pk]
+        indexes = reorder.get('indexes', '')
+        if isinstance(indexes, str):
+            indexes = indexes.split(',')
+        return indexes
+
+    def reorder(self, request, klass, reorder):
+        """
+        Apply a single reorder of the objects of `klass`, as posted to the
+        `do_sorting` views: either the complete new order of a group in
+        `indexes` or a single move in `moved` and `after` or `before`. Raise
+        ObjectDoesNotExist when the objects posted don't match those in the
+        database.
+
+        With `sort_view_optimistic`, a move posted with the `version` of its
+        group is applied optimistically, and the new version of the group is
+        returned after every reorder of a single group, so that the next one
+        can be posted with it. Otherwise the rows are locked, without
+        waiting for other transactions to release them.
+        """
+        timer = get_request_timer(request)
+        filters = self.get_reorder_filters(request, klass)
+
+        if reorder.get('moved'):
+            version = reorder.get('version') or None \
+                if self.sort_view_optimistic else None
+            queryset = klass.objects.filter(**filters)
+            move_object(queryset, reorder['moved'],
+                after=reorder.get('after') or None,
+                before=reorder.get('before') or None,
+                version=version, nowait=True)
+            if self.sort_view_optimistic:
+                return bump_order_version(klass, get_group_filters(queryset,
+                    reorder['moved']), queryset.db)
+            return None
+
+        indexes = [str(idx) for idx in self.get_reorder_pks(reorder)]
+
+        filters['pk__in'] = indexes
+
+        # Lock rows that we might update, in primary key order, reading only
+        # their primary keys, order values and groups
+        qs = klass.objects.filter(**filters)
+        options = get_sortable_options(klass)
+        order_field_name = options.order_field_name
+
+        with transaction.atomic(using=qs.db):
+            rows = {str(row[0]): row for row in
+                qs.select_for_update(nowait=True).order_by('pk').values_list(
+                    'pk', order_field_name, *options.group_fields)}
+            timer.lap('read')
+            if len(indexes) != len(rows):
+                raise ObjectDoesNotExist(u'The objects to sort could not be '
+                    'found.')
+
+            sequence = [(index, rows[index][1]) for index in indexes]
+
+            order_gap = getattr(klass, 'order_gap', None)
+            if order_gap and order_gap > 1:
+                # stay within the span of the posted objects, like the
+                # contiguous order does: the group may have other objects,
+                # e.g. those of other pages or filtered out of an inline
+                orders = [order for index, order in sequence]
+                lowest, highest = get_order_field_range(options.order_field)
+                lowest = max(lowest, min(orders))
+                span = max(max(orders), lowest + len(orders) - 1)
+                highest = span if highest is None else min(highest, span)
+                changes = get_sparse_order(sequence, order_gap,
+                    descending=options.descending,
+                    bounds=(lowest, highest))
+            else:
+                changes = get_contiguous_order(sequence,
+                    step=-1 if options.descending else 1)
+
+            if has_reorder_receivers(klass):
+                groups = {}
+                for index, order in changes.items():
+                    row = rows[index]
+                    group = tuple(zip(options.group_fields, row[2:]))
+                    groups.setdefault(group, []).append(
+                        (row[0], row[1], order))
+                for group, group_changes in groups.items():
+                    send_reorder_signals(klass, dict(group),
+                        group_changes, qs.db)
+
+            # perform the update only if the order field has changed
+            write_order(qs, order_field_name, {rows[index][0]: order
+                for index, order in changes.items()})
+
+            versions = [bump_order_version(klass,
+                dict(zip(options.group_fields, group)), qs.db)
+                for group in set(rows[index][2:] for index in changes)]
+        if self.sort_view_optimistic and len(versions) == 1:
+            return versions[0]
+        return None
+
 
 class NonSortableParentAdmin(SortableAdmin):
     def changelist_view(self, request, extra_context=None):
@@ -349,9 +1001,13 @@ class SortableInlineBase(SortableAdminBase, InlineModelAdmin):
                 ' and SortableStackedInline must inherit from SortableMixin'
                 ' (or Sortable for legacy implementations)')
 
+    @property
+    def model_type_id(self):
+        return ContentType.objects.get_for_model(self.model).id
+
     def get_queryset(self, request):
         qs = super(SortableInlineBase, self).get_queryset(request)
-        if get_is_sortable(qs):
+        if self.get_is_sortable(request, qs):
             self.model.is_sortable = True
         else:
             self.model.is_sortable = False
@@ -0,0 +1,131 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Window
+from django.db.models.functions import Lag
+
+from adminsortable.options import get_sortable_options
+from adminsortable.ordering import get_order_field_range
+from adminsortable.utils import get_sortable_models
+
+
+class Command(BaseCommand):
+    help = ('Checks the order values of sortable models for duplicates '
+        'within a group, gaps, unassigned values and values close to the '
+        "maximum of the order field.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', metavar='app_label[.ModelName]',
+            help='Only check these apps or models.')
+        parser.add_argument('--json', action='store_true',
+            help='Write the results as JSON.')
+        parser.add_argument('--near-max', type=float, default=0.9,
+            help='Report order values above this fraction of the maximum '
+                 'of the order field (default: 0.9).')
+        parser.add_argument('--max-examples', type=int, default=10,
+            help='Number of offending rows listed per problem (default: 10).')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+            help='Number of rows fetched at a time (default: 2000).')
+        parser.add_argument('--fail', action='store_true',
+            help='Exit with an error when duplicate, unassigned or near '
+                 'maximum values are found.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+            help='Database to check (default: "default").')
+
+    def handle(self, *args, **options):
+        try:
+            models = get_sortable_models(options['labels'])
+        except LookupError as e:
+            raise CommandError(e)
+
+        results = [self.check_model(model, **options) for model in models]
+        failed = [result['model'] for result in results
+            if result['duplicates'] or result['unassigned'] or
+            result['near_max']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({'ok': not failed,
+                'models': results}, cls=DjangoJSONEncoder, indent=2))
+        else:
+            for result in results:
+                self.write_result(result)
+
+        if failed and options['fail']:
+            raise CommandError('Order values need attention: {0}'.format(
+                ', '.join(failed)))
+
+    def check_model(self, model, near_max, max_examples, chunk_size,
+            database, **options):
+        sortable_options = get_sortable_options(model)
+        result = {'model': model._meta.label, 'rows': 0, 'groups': 0,
+            'duplicates': 0, 'gaps': 0, 'unassigned': 0, 'near_max': 0,
+            'max_order': None, 'field_max': None, 'examples': {
+                'duplicates': [], 'unassigned': [], 'near_max': []}}
+        if not sortable_options.is_valid:
+            result['error'] = 'not configured correctly'
+            return result
+
+        order_field_name = sortable_options.order_field_name
+        group_fields = sortable_options.group_fields
+        step = getattr(model, 'order_gap', None) or 1
+        highest = get_order_field_range(sortable_options.order_field)[1]
+        threshold = highest * near_max if highest is not None else None
+        result['field_max'] = highest
+
+        # a single pass over the table, each row next to its predecessor
+        rows = model._base_manager.using(database).annotate(
+            sortable_previous=Window(Lag(order_field_name),
+                partition_by=[F(name) for name in group_fields] or None,
+                order_by=[F(order_field_name).asc(), F('pk').asc()]),
+        ).order_by(*(group_fields + [order_field_name, 'pk'])).values_list(
+            'pk', order_field_name, 'sortable_previous', *group_fields)
+
+        def add_example(problem, pk, order, group):
+            if len(result['examples'][problem]) < max_examples:
+                result['examples'][problem].append({'pk': pk, 'order': order,
+                    'group': dict(zip(group_fields, group))})
+
+        for row in rows.iterator(chunk_size=chunk_size):
+            pk, order, previous, group = row[0], row[1], row[2], row[3:]
+            result['rows'] += 1
+            if result['max_order'] is None or order > result['max_order']:
+                result['max_order'] = order
+
+            if previous is None:
+                result['groups'] += 1
+            elif order == previous:
+                result['duplicates'] += 1
+                add_example('duplicates', pk, order, group)
+            elif order - previous > step:
+                result['gaps'] += 1
+
+            if order < 1:
+                result['unassigned'] += 1
+                add_example('unassigned', pk, order, group)
+            if threshold is not None and order > threshold:
+                result['near_max'] += 1
+                add_example('near_max', pk, order, group)
+
+        return result
+
+    def write_result(self, result):
+        if result.get('error'):
+            self.stderr.write('{model}: {error}'.format(**result))
+            return
+
+        problems = ['{0} {1}'.format(result[name], label) for name, label in (
+            ('duplicates', 'duplicate'), ('unassigned', 'unassigned'),
+            ('near_max', 'near maximum')) if result[name]]
+        summary = '{model}: {rows} rows in {groups} groups, {gaps} gaps'.format(
+            **result)
+        if problems:
+            self.stdout.write(self.style.WARNING('{0}, {1} values.'.format(
+                summary, ', '.join(problems))))
+            for problem, examples in result['examples'].items():
+                for example in examples:
+                    self.stdout.write('  {0}: pk={pk} order={order} '
+                        'group={group}'.format(problem, **example))
+        else:
+            self.stdout.write('{0}.'.format(summary))
@@ -0,0 +1,159 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F, Max, Window
+from django.db.models.functions import RowNumber
+
+from adminsortable.options import get_sortable_options
+from adminsortable.ordering import get_order_field_range, write_order
+from adminsortable.utils import get_sortable_models
+
+
+class Command(BaseCommand):
+    help = ('Renumbers the order values of sortable models, per '
+        'SortableForeignKey group, so they start at the gap and are spaced '
+        'by it, without changing the order of the objects.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', metavar='app_label[.ModelName]',
+            help='Only renumber these apps or models.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+            help='Number of rows written per UPDATE (default: 1000).')
+        parser.add_argument('--gap', type=int, default=None,
+            help="Space between order values (default: the model's "
+                 "order_gap, or 1).")
+        parser.add_argument('--workers', type=int, default=1,
+            help='Number of threads writing groups in parallel '
+                 '(default: 1).')
+        parser.add_argument('--dry-run', action='store_true',
+            help='Report the rows that would change without writing them.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+            help='Database to renumber (default: "default").')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive.')
+        if options['gap'] is not None and options['gap'] < 1:
+            raise CommandError('--gap must be positive.')
+
+        try:
+            models = get_sortable_models(options['labels'])
+        except LookupError as e:
+            raise CommandError(e)
+
+        for model in models:
+            self.compact(model, **options)
+
+    def compact(self, model, batch_size, gap, workers, dry_run, database,
+            **options):
+        sortable_options = get_sortable_options(model)
+        if not sortable_options.is_valid:
+            self.stderr.write('Skipping {0}: it is not configured '
+                'correctly.'.format(model._meta.label))
+            return
+
+        order_field_name = sortable_options.order_field_name
+        group_fields = sortable_options.group_fields
+        step = gap or getattr(model, 'order_gap', None) or 1
+        highest = get_order_field_range(sortable_options.order_field)[1]
+        queryset = model._base_manager.using(database)
+
+        if highest is not None:
+            if group_fields:
+                largest_group = queryset.values(*group_fields).order_by() \
+                    .annotate(size=Count('pk')).aggregate(Max('size'))[
+                        'size__max'] or 0
+            else:
+                largest_group = queryset.count()
+            if largest_group * step > highest:
+                raise CommandError('{0} has too many objects in a group to '
+                    'space them by {1}.'.format(model._meta.label, step))
+
+        # one pass over the table, numbering the objects within their group
+        rows = queryset.annotate(sortable_position=Window(RowNumber(),
+            partition_by=[F(name) for name in group_fields] or None,
+            order_by=[F(order_field_name).asc(), F('pk').asc()],
+        )).order_by(*(group_fields + [order_field_name, 'pk'])).values_list(
+            'pk', order_field_name, 'sortable_position', *group_fields)
+
+        executor = ThreadPoolExecutor(workers) if workers > 1 and \
+            not dry_run else None
+        futures = []
+        counts = {'rows': 0, 'changed': 0, 'written': 0}
+
+        def flush(orders, changed):
+            if dry_run or not changed:
+                return
+            group = (queryset, order_field_name, orders, changed, batch_size,
+                database)
+            if executor is not None:
+                futures.append(executor.submit(self.write_group_in_thread,
+                    *group))
+            else:
+                counts['written'] += self.write_group(*group)
+
+        # the groups are written whole, each by a single worker
+        key = orders = None
+        changed = 0
+        try:
+            for row in rows.iterator(chunk_size=batch_size):
+                pk, order, position = row[:3]
+                if orders is None or row[3:] != key:
+                    if orders is not None:
+                        flush(orders, changed)
+                    key, orders, changed = row[3:], {}, 0
+                counts['rows'] += 1
+                orders[pk] = (order, position * step)
+                if position * step != order:
+                    changed += 1
+                    counts['changed'] += 1
+            if orders is not None:
+                flush(orders, changed)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+                counts['written'] += sum(future.result()
+                    for future in futures)
+
+        if dry_run:
+            self.stdout.write('{0}: {1} of {2} rows would be '
+                'renumbered.'.format(model._meta.label, counts['changed'],
+                    counts['rows']))
+            return
+
+        self.stdout.write('{0}: renumbered {1} of {2} rows.'.format(
+            model._meta.label, counts['written'], counts['rows']))
+        if counts['written'] < counts['changed']:
+            self.stderr.write('{0}: {1} rows were left alone because their '
+                'group changed while renumbering, run the command '
+                'again.'.format(model._meta.label,
+                    counts['changed'] - counts['written']))
+
+    def write_group(self, queryset, order_field_name, orders, changed,
+            batch_size, database):
+        """
+        Write the new order values of one group, a dict of {pk: (order,
+        new_order)}, in a single transaction, and return the number of rows
+        renumbered. Every row of the group is written only if it still has
+        the order value it was read with, so that a group whose objects were
+        moved since is left alone as a whole, instead of partly renumbered.
+        """
+        pks = list(orders)
+        with transaction.atomic(using=database):
+            for start in range(0, len(pks), batch_size):
+                batch = pks[start:start + batch_size]
+                if write_order(queryset, order_field_name,
+                        {pk: orders[pk][1] for pk in batch},
+                        expected={pk: orders[pk][0] for pk in batch}) \
+                        != len(batch):
+                    transaction.set_rollback(True, using=database)
+                    return 0
+        return changed
+
+    def write_group_in_thread(self, *group):
+        try:
+            return self.write_group(*group)
+        finally:
+            # worker threads have their own connection
+            connections[group[-1]].close()
@@ -1,16 +1,16 @@
+from functools import reduce
+from operator import or_
+
 from django import VERSION
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.functions import Lag, Lead, RowNumber
+from django.db.models.signals import class_prepared
 
 from adminsortable.fields import SortableForeignKey
-
-
-class MultipleSortableForeignKeyException(Exception):
-    def __init__(self, value):
-        self.value = value
-
-    def __str__(self):
-        return repr(self.value)
+from adminsortable.options import (MultipleSortableForeignKeyException,
+                                   get_sortable_options)
+from adminsortable.ordering import lock_order_group, lock_order_groups
 
 
 class SortableMixin(models.Model):
@@ -24,11 +24,21 @@ class SortableMixin(models.Model):
     inherits Sortable
 
     `save` the override of save increments the last/highest value of
-    `Meta.ordering` by 1
+    `Meta.ordering` by 1, or by `order_gap` when sparse ordering is enabled,
+    within the group of the `SortableForeignKey` (or generic foreign key).
+    The group is locked until the new object is inserted, so objects saved
+    concurrently into the same group never share an order value
+
+    `order_gap` enables sparse ordering when set to an integer greater than 1.
+    New objects are allocated order values `order_gap` apart, and moving an
+    object only rewrites its own order value (the midpoint between its new
+    neighbours) until the gap between two neighbours is exhausted, at which
+    point only the surrounding objects are renumbered.
     """
 
     is_sortable = False
     sorting_filters = ()
+    order_gap = None
 
     # legacy support
     sortable_by = None
@@ -41,44 +51,19 @@ class SortableMixin(models.Model):
     def model_type_id(cls):
         return ContentType.objects.get_for_model(cls).id
 
-    def __init__(self, *args, **kwargs):
-        super(SortableMixin, self).__init__(*args, **kwargs)
+    @classmethod
+    def check(cls, **kwargs):
+        errors = super(SortableMixin, cls).check(**kwargs)
+        errors.extend(get_sortable_options(cls).check())
+        return errors
 
-        # Check that Meta.ordering contains one value
-        try:
-            self.order_field_name = self._meta.ordering[0].replace('-', '')
-        except IndexError:
-            raise ValueError(u'You must define the Meta.ordering '
-                u'property on your model.')
-
-        # get the model field defined by `Meta.ordering`
-        self.order_field = self._meta.get_field(self.order_field_name)
-
-        integer_fields = (models.PositiveIntegerField, models.IntegerField,
-            models.PositiveSmallIntegerField, models.SmallIntegerField,
-            models.BigIntegerField,)
-
-        # check that the order field is an integer type
-        if not self.order_field or not isinstance(self.order_field,
-                integer_fields):
-            raise NotImplementedError(u'You must define the field '
-                '`Meta.ordering` refers to, and it must be of type: '
-                'PositiveIntegerField, IntegerField, '
-                'PositiveSmallIntegerField, SmallIntegerField, '
-                'BigIntegerField')
-
-        # Validate that model only contains at most one SortableForeignKey
-        sortable_foreign_keys = []
-        for field in self._meta.fields:
-            if isinstance(field, SortableForeignKey):
-                sortable_foreign_keys.append(field)
-
-        sortable_foreign_keys_length = len(sortable_foreign_keys)
-        if sortable_foreign_keys_length > 1:
-            raise MultipleSortableForeignKeyException(
-                u'{0} may only have one SortableForeignKey'.format(self))
-        elif sortable_foreign_keys_length == 1:
-            self.__class__.sortable_foreign_key = sortable_foreign_keys[0]
+    @property
+    def order_field_name(self):
+        return get_sortable_options(self.__class__).order_field_name
+
+    @property
+    def order_field(self):
+        return get_sortable_options(self.__class__).order_field
 
     def _get_order_field_value(self):
         try:
@@ -88,31 +73,50 @@ class SortableMixin(models.Model):
             'typecast to an integer.'
 
     def save(self, *args, **kwargs):
+        options = get_sortable_options(self.__class__)
+        options.validate()
+
         needs_default = (self._state.adding if VERSION >= (1, 8) else not self.pk)
         if not getattr(self, self.order_field_name) and needs_default:
-            try:
-                current_max = self.__class__.objects.aggregate(
-                    models.Max(self.order_field_name))[self.order_field_name + '__max'] or 0
-
-                setattr(self, self.order_field_name, current_max + 1)
-            except (TypeError, IndexError):
-                pass
+            using = kwargs.get('using') or router.db_for_write(
+                self.__class__, instance=self)
+
+            # hold the group lock until the object is inserted
+            with transaction.atomic(using=using):
+                group = options.get_group_filters(self)
+                lock_order_group(self.__class__, group, using)
+                try:
+                    current_max = self.__class__._base_manager.using(using) \
+                        .filter(**group).aggregate(models.Max(
+                            self.order_field_name))[self.order_field_name + '__max'] or 0
+
+                    setattr(self, self.order_field_name,
+                        current_max + (self.order_gap or 1))
+                except (TypeError, IndexError):
+                    pass
+
+                super(SortableMixin, self).save(*args, **kwargs)
+            return
 
         super(SortableMixin, self).save(*args, **kwargs)
 
     def _filter_objects(self, filters, filter_args, extra_filters, filter_kwargs, filter_on_sortable_fk):
         # DEPRECATION WARNING: `extra_filters` will be replaced by `filter_kwargs` in the next release
 
+        get_sortable_options(self.__class__).validate()
+
         if extra_filters:
             filters.update(extra_filters)
 
         if filter_kwargs:
             filters.update(filter_kwargs)
 
-        if self.sortable_foreign_key and filter_on_sortable_fk:
-            # sfk_obj == sortable foreign key instance
-            sfk_obj = getattr(self, self.sortable_foreign_key.name)
-            filters.update({ self.sortable_foreign_key.name: sfk_obj.id })
+        if filter_on_sortable_fk:
+            # filter on the raw values of the sortable foreign key (or the
+            # generic foreign key), so the related instance doesn't have to
+            # be fetched
+            filters.update(get_sortable_options(self.__class__)
+                .get_group_filters(self))
 
         try:
             order_by = '-{0}'.format(self.order_field_name) \
@@ -143,6 +147,128 @@ class SortableMixin(models.Model):
         )
 
 
+class SortableQuerySet(models.QuerySet):
+    """
+    `bulk_create` assigns order values to the objects that don't have one,
+    as `SortableMixin.save` would, reading the highest order value of all
+    the affected groups with a single query.
+
+    `with_neighbours` annotates every object with its neighbours, so
+    listings don't need to call `get_next` and `get_previous` per object.
+    """
+
+    def with_neighbours(self, filter_on_sortable_fk=True):
+        """
+        Annotate each object with the primary keys of the objects `get_next`
+        and `get_previous` would return (`next_pk` and `previous_pk`), its
+        1-based `position` and the number of objects in its group
+        (`group_size`), using window functions in the same query.
+
+        Neighbours are looked up among the objects selected by the queryset,
+        within the group of the `SortableForeignKey` (or `GenericForeignKey`)
+        unless `filter_on_sortable_fk` is False, so filter the queryset before
+        calling this method. Slicing the result afterwards is fine.
+        """
+        options = get_sortable_options(self.model)
+        options.validate()
+
+        partition_by = None
+        if filter_on_sortable_fk and options.group_fields:
+            partition_by = [models.F(name) for name in options.group_fields]
+        order_by = [models.F(options.order_field_name).asc(),
+            models.F('pk').asc()]
+
+        def window(expression, order_by=order_by):
+            return models.Window(expression, partition_by=partition_by,
+                order_by=order_by)
+
+        return self.annotate(
+            previous_pk=window(Lag('pk')),
+            next_pk=window(Lead('pk')),
+            position=window(RowNumber()),
+            group_size=window(models.Count('pk'), order_by=None),
+        )
+
+    def _get_group_maxima(self, options, keys):
+        fields = options.group_fields
+        order_field_name = options.order_field_name
+        queryset = self.model._base_manager.using(self.db).order_by()
+
+        if not fields:
+            current_max = queryset.aggregate(models.Max(order_field_name))[
+                order_field_name + '__max']
+            return {(): current_max}
+
+        if len(fields) == 1:
+            values = set(key[0] for key in keys)
+            condition = models.Q(**{'{0}__in'.format(fields[0]):
+                [value for value in values if value is not None]})
+            if None in values:
+                condition |= models.Q(**{'{0}__isnull'.format(fields[0]): True})
+        else:
+            condition = reduce(or_, [models.Q(**dict(zip(fields, key)))
+                for key in keys])
+
+        rows = queryset.filter(condition).values_list(*fields).annotate(
+            models.Max(order_field_name))
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        options = get_sortable_options(self.model)
+        options.validate()
+
+        order_field_name = options.order_field_name
+        groups = {}
+        for obj in objs:
+            if not getattr(obj, order_field_name):
+                key = tuple(getattr(obj, name) for name in options.group_fields)
+                groups.setdefault(key, []).append(obj)
+
+        if not groups:
+            return super(SortableQuerySet, self).bulk_create(objs, *args,
+                **kwargs)
+
+        # hold the group locks until the objects are inserted
+        with transaction.atomic(using=self.db):
+            lock_order_groups(self.model, [dict(zip(options.group_fields, key))
+                for key in groups], self.db)
+            maxima = self._get_group_maxima(options, list(groups))
+
+            step = getattr(self.model, 'order_gap', None) or 1
+            for key, group_objs in groups.items():
+                current_max = maxima.get(key) or 0
+                for obj in group_objs:
+                    current_max += step
+                    setattr(obj, order_field_name, current_max)
+
+            return super(SortableQuerySet, self).bulk_create(objs, *args,
+                **kwargs)
+
+
+class SortableManager(models.Manager.from_queryset(SortableQuerySet)):
+    """
+    Manager for sortable models whose `bulk_create` assigns order values.
+    Add it to a model with `objects = SortableManager()`.
+    """
+    pass
+
+
+def prepare_sortable_model(sender, **kwargs):
+    """
+    Compute the sortable options of every concrete sortable model once,
+    when its class is prepared.
+    """
+    if issubclass(sender, SortableMixin):
+        options = get_sortable_options(sender)
+        if options.sortable_foreign_key is not None:
+            sender.sortable_foreign_key = options.sortable_foreign_key
+
+
+class_prepared.connect(prepare_sortable_model,
+    dispatch_uid='adminsortable_prepare_sortable_model')
+
+
 # for legacy support of existing implementations
 class Sortable(SortableMixin):
 
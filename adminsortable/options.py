@@ -0,0 +1,139 @@
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+
+from adminsortable.fields import SortableForeignKey
+
+
+INTEGER_FIELDS = (models.PositiveIntegerField, models.IntegerField,
+    models.PositiveSmallIntegerField, models.SmallIntegerField,
+    models.BigIntegerField,)
+
+
+class MultipleSortableForeignKeyException(Exception):
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+
+class SortableOptions(object):
+    """
+    The sortable configuration of a model class: the field named by
+    `Meta.ordering`, its direction and the model's `SortableForeignKey`.
+
+    `group_fields` are the attnames that split the objects into
+    independently ordered groups: the `SortableForeignKey`, or else the
+    content type and object id of a single `GenericForeignKey`.
+
+    It is computed once per model class when the class is prepared, so
+    instances don't have to introspect their model every time one is
+    created.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.order_field_name = None
+        self.order_field = None
+        self.descending = False
+
+        ordering = model._meta.ordering[0] if model._meta.ordering else None
+        if isinstance(ordering, str):
+            self.order_field_name = ordering.lstrip('-')
+            self.descending = ordering.startswith('-')
+            try:
+                self.order_field = model._meta.get_field(
+                    self.order_field_name)
+            except FieldDoesNotExist:
+                pass
+
+        self.sortable_foreign_keys = [field for field in model._meta.fields
+            if isinstance(field, SortableForeignKey)]
+        self.sortable_foreign_key = self.sortable_foreign_keys[0] \
+            if len(self.sortable_foreign_keys) == 1 else None
+
+        self.group_fields = []
+        generic_foreign_keys = [field for field in model._meta.private_fields
+            if isinstance(field, GenericForeignKey)]
+        if self.sortable_foreign_key is not None:
+            self.group_fields = [self.sortable_foreign_key.attname]
+        elif len(generic_foreign_keys) == 1:
+            try:
+                self.group_fields = [
+                    model._meta.get_field(
+                        generic_foreign_keys[0].ct_field).attname,
+                    model._meta.get_field(
+                        generic_foreign_keys[0].fk_field).attname,
+                ]
+            except FieldDoesNotExist:
+                pass
+
+    @property
+    def is_valid(self):
+        return self.order_field_name is not None and \
+            isinstance(self.order_field, INTEGER_FIELDS) and \
+            len(self.sortable_foreign_keys) <= 1
+
+    def get_group_filters(self, instance):
+        """
+        Return the filters selecting the group `instance` is ordered in.
+        """
+        return {name: getattr(instance, name) for name in self.group_fields}
+
+    def check(self):
+        """
+        Return the system check errors for the model's sortable
+        configuration.
+        """
+        errors = []
+        if self.order_field_name is None:
+            errors.append(checks.Error(
+                u'You must define the Meta.ordering property on your model.',
+                obj=self.model, id='adminsortable.E001'))
+        elif not isinstance(self.order_field, INTEGER_FIELDS):
+            errors.append(checks.Error(
+                u'You must define the field `Meta.ordering` refers to, and '
+                'it must be of type: PositiveIntegerField, IntegerField, '
+                'PositiveSmallIntegerField, SmallIntegerField, '
+                'BigIntegerField',
+                obj=self.model, id='adminsortable.E002'))
+        if len(self.sortable_foreign_keys) > 1:
+            errors.append(checks.Error(
+                u'{0} may only have one SortableForeignKey'.format(
+                    self.model.__name__),
+                obj=self.model, id='adminsortable.E003'))
+        return errors
+
+    def validate(self):
+        """
+        Raise the exception matching the first configuration error, for
+        code paths that run without the system checks.
+        """
+        if self.is_valid:
+            return
+        if self.order_field_name is None:
+            raise ValueError(u'You must define the Meta.ordering '
+                u'property on your model.')
+        if not isinstance(self.order_field, INTEGER_FIELDS):
+            raise NotImplementedError(u'You must define the field '
+                '`Meta.ordering` refers to, and it must be of type: '
+                'PositiveIntegerField, IntegerField, '
+                'PositiveSmallIntegerField, SmallIntegerField, '
+                'BigIntegerField')
+        raise MultipleSortableForeignKeyException(
+            u'{0} may only have one SortableForeignKey'.format(
+                self.model.__name__))
+
+
+def get_sortable_options(model):
+    """
+    Return the `SortableOptions` of `model`, computing them on first use
+    for models that were prepared before adminsortable was imported.
+    """
+    options = model.__dict__.get('_sortable_meta')
+    if options is None:
+        options = SortableOptions(model)
+        model._sortable_meta = options
+    return options
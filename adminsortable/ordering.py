@@ -0,0 +1,829 @@
+import hashlib
+import time
+import uuid
+import zlib
+from bisect import bisect_left
+from functools import partial, reduce
+from operator import or_
+from threading import local
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import OperationalError, connections, transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.db.models import Case, F, Q, Value, When
+from django.utils.encoding import force_bytes, force_str
+from django.utils.module_loading import import_string
+
+from adminsortable.options import get_sortable_options
+from adminsortable.signals import post_reorder, pre_reorder
+
+
+class ReorderConflict(Exception):
+    """
+    Raised when the objects being reordered were changed by someone else,
+    or are locked by them. `queryset` selects the group of the objects and
+    `group` holds its filters, when they are known.
+    """
+
+    def __init__(self, message, queryset=None, group=None):
+        super(ReorderConflict, self).__init__(message)
+        self.queryset = queryset
+        self.group = group
+
+
+def get_order_field_range(order_field):
+    """
+    Return the lowest and highest values that may be stored in `order_field`.
+    Order values start at 1, as 0 marks an object whose order has not been
+    assigned yet.
+    """
+    upper = BaseDatabaseOperations.integer_field_ranges.get(
+        order_field.get_internal_type(), (None, None))[1]
+    return 1, upper
+
+
+def get_contiguous_order(sequence, step=1):
+    """
+    `sequence` is a list of (pk, order) tuples in the new display order.
+    Number the objects contiguously, starting from the lowest existing
+    order value, and return a dict of {pk: order} for the objects whose
+    order value changes.
+    """
+    if not sequence:
+        return {}
+
+    start_index = min(order for pk, order in sequence)
+    changes = {}
+    for pk, order in sequence:
+        if order != start_index:
+            changes[pk] = start_index
+        start_index += step
+    return changes
+
+
+def _get_increasing_positions(keys):
+    """
+    Return the positions of a longest strictly increasing subsequence of
+    `keys`. Those objects are already in the right place relative to each
+    other and don't need to be written.
+    """
+    tails, tail_positions = [], []
+    previous = [None] * len(keys)
+
+    for position, key in enumerate(keys):
+        index = bisect_left(tails, key)
+        if index == len(tails):
+            tails.append(key)
+            tail_positions.append(position)
+        else:
+            tails[index] = key
+            tail_positions[index] = position
+        previous[position] = tail_positions[index - 1] if index else None
+
+    positions = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        positions.add(position)
+        position = previous[position]
+    return positions
+
+
+def get_sparse_order(sequence, gap, descending=False, bounds=(1, None)):
+    """
+    `sequence` is a list of (pk, order) tuples in the new display order.
+
+    Keep the longest run of objects that are already in the right relative
+    order and give every other object a value between its new neighbours,
+    leaving `gap` between values where there is room. When two neighbours
+    have no free value left between them, the surrounding objects are
+    rebalanced, widening the window one neighbour at a time until it fits.
+
+    Return a dict of {pk: order} for the objects whose order value changes.
+    """
+    if not sequence:
+        return {}
+
+    sign = -1 if descending else 1
+    lowest, highest = bounds
+    if descending:
+        lowest, highest = (
+            -highest if highest is not None else None, -lowest)
+
+    keys = [sign * order for pk, order in sequence]
+    kept = _get_increasing_positions(keys)
+    length = len(keys)
+    start = 0
+
+    while start < length:
+        if start in kept:
+            start += 1
+            continue
+
+        end = start
+        while end + 1 < length and end + 1 not in kept:
+            end += 1
+
+        while True:
+            lower = keys[start - 1] if start > 0 else None
+            upper = keys[end + 1] if end + 1 < length else None
+            count = end - start + 1
+
+            if lower is None and upper is None:
+                lower = min(keys[start:end + 1]) - gap
+            if lower is None:
+                lower = upper - gap * (count + 1)
+            if upper is None:
+                upper = lower + gap * (count + 1)
+            if lowest is not None:
+                lower = max(lower, lowest - 1)
+            if highest is not None:
+                upper = min(upper, highest + 1)
+
+            if upper - lower > count:
+                step = (upper - lower) // (count + 1)
+                for offset in range(count):
+                    keys[start + offset] = lower + step * (offset + 1)
+                break
+
+            if start == 0 and end == length - 1:
+                raise ValueError(u'There is no room left in the order '
+                    'field to place {0} objects.'.format(length))
+
+            # the gap is exhausted, rebalance one more neighbour on each side
+            if start > 0:
+                start -= 1
+            if end + 1 < length:
+                end += 1
+                while end + 1 < length and end + 1 not in kept:
+                    end += 1
+
+        start = end + 1
+
+    return {
+        pk: sign * key
+        for (pk, order), key in zip(sequence, keys)
+        if sign * key != order
+    }
+
+
+def write_order(queryset, order_field_name, changes, expected=None):
+    """
+    Write the {pk: order} values in `changes` to the objects of `queryset`,
+    and return the number of rows updated.
+
+    When `expected` maps the primary keys to the order values they were
+    read with, rows whose order value has changed since are left alone.
+
+    The values are written by the writer for the database of `queryset`,
+    see `get_order_writer`.
+    """
+    if not changes:
+        return 0
+    return get_order_writer(queryset.db)(queryset, order_field_name, changes,
+        expected)
+
+
+def get_order_writer(using):
+    """
+    Return the function writing new order values to the database `using`:
+    the one named by the `ADMINSORTABLE_ORDER_WRITER` setting, or else a
+    single `UPDATE ... FROM unnest(...)` on PostgreSQL, a single
+    `UPDATE ... FROM (VALUES ...)` on SQLite 3.33 or higher, and chunked
+    `UPDATE ... CASE` statements on other databases.
+
+    Writers are called with the queryset, the order field name, the
+    {pk: order} changes and the expected {pk: order} values, or None, and
+    return the number of rows updated.
+    """
+    path = getattr(settings, 'ADMINSORTABLE_ORDER_WRITER', None)
+    if path:
+        return import_string(path)
+
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        return write_order_unnest
+    if connection.vendor == 'sqlite' and \
+            connection.Database.sqlite_version_info >= (3, 33):
+        return write_order_values
+    return write_order_case
+
+
+def write_order_case(queryset, order_field_name, changes, expected=None):
+    """
+    Write the new order values with `UPDATE ... SET order = CASE ...`
+    statements, in chunks that keep each statement reasonably small.
+    """
+    order_field = queryset.model._meta.get_field(order_field_name)
+    max_query_params = connections[queryset.db].features.max_query_params
+    # the primary key twice and the order value, plus the primary key and
+    # expected order value of the filter
+    width = 3 if expected is None else 5
+    batch_size = max(1, max_query_params // width) if max_query_params \
+        else 1000
+
+    pks, updated = list(changes), 0
+    for start in range(0, len(pks), batch_size):
+        batch = pks[start:start + batch_size]
+        rows = queryset.filter(pk__in=batch)
+        if expected is not None:
+            rows = rows.filter(reduce(or_, [
+                Q(pk=pk, **{order_field_name: expected[pk]}) for pk in batch]))
+        updated += rows.update(**{
+            order_field_name: Case(*[When(pk=pk, then=Value(changes[pk]))
+                for pk in batch], output_field=order_field)
+        })
+    return updated
+
+
+def _get_order_write_columns(queryset, order_field_name, connection):
+    meta = queryset.model._meta
+    quote_name = connection.ops.quote_name
+    return (quote_name(meta.db_table), meta.pk,
+        quote_name(meta.pk.column), meta.get_field(order_field_name),
+        quote_name(meta.get_field(order_field_name).column))
+
+
+def write_order_unnest(queryset, order_field_name, changes, expected=None):
+    """
+    Write the new order values with a single `UPDATE ... FROM unnest(...)`
+    statement on PostgreSQL, passing the primary keys and order values as
+    arrays, so the statement has the same size for any number of rows.
+
+    Rows are matched by primary key only; the primary keys in `changes` are
+    expected to have been read through `queryset`.
+    """
+    connection = connections[queryset.db]
+    table, pk_field, pk_column, order_field, order_column = \
+        _get_order_write_columns(queryset, order_field_name, connection)
+    pks = list(changes)
+    arrays = [
+        [pk_field.get_db_prep_value(pk, connection) for pk in pks],
+        [changes[pk] for pk in pks],
+    ]
+    types = [pk_field.cast_db_type(connection),
+        order_field.cast_db_type(connection)]
+    condition = ''
+    if expected is not None:
+        arrays.append([expected[pk] for pk in pks])
+        types.append(types[1])
+        condition = ' AND {0}.{1} = v.expected'.format(table, order_column)
+
+    sql = ('UPDATE {table} SET {order} = v.new_order FROM unnest({arrays}) '
+        'AS v(pk, new_order{expected}) WHERE {table}.{pk} = v.pk{condition}'
+    ).format(table=table, order=order_column, pk=pk_column,
+        arrays=', '.join('%s::{0}[]'.format(db_type) for db_type in types),
+        expected=', expected' if expected is not None else '',
+        condition=condition)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, arrays)
+        return cursor.rowcount
+
+
+def write_order_values(queryset, order_field_name, changes, expected=None):
+    """
+    Write the new order values with `UPDATE ... FROM (VALUES ...)`
+    statements on SQLite 3.33 or higher, in chunks that stay within its
+    limit on query parameters.
+
+    Rows are matched by primary key only; the primary keys in `changes` are
+    expected to have been read through `queryset`.
+    """
+    connection = connections[queryset.db]
+    table, pk_field, pk_column, order_field, order_column = \
+        _get_order_write_columns(queryset, order_field_name, connection)
+    width = 2 if expected is None else 3
+    batch_size = max(1, (connection.features.max_query_params or 999) //
+        width)
+    condition = '' if expected is None else \
+        ' AND {0}.{1} = v.column3'.format(table, order_column)
+
+    pks, updated = list(changes), 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+            params = []
+            for pk in batch:
+                params.extend([pk_field.get_db_prep_value(pk, connection),
+                    changes[pk]])
+                if expected is not None:
+                    params.append(expected[pk])
+            cursor.execute(
+                'UPDATE {table} SET {order} = v.column2 FROM (VALUES {rows}) '
+                'AS v WHERE {table}.{pk} = v.column1{condition}'.format(
+                    table=table, order=order_column, pk=pk_column,
+                    rows=', '.join(['({0})'.format(', '.join(['%s'] * width))]
+                        * len(batch)),
+                    condition=condition), params)
+            updated += cursor.rowcount
+    return updated
+
+
+def _get_order_version_key(model, group):
+    group = repr(sorted((name, force_str(value))
+        for name, value in group.items()))
+    return 'adminsortable:order_version:{0}:{1}'.format(
+        model._meta.label_lower, hashlib.md5(force_bytes(group)).hexdigest())
+
+
+def get_order_version(model, group=None):
+    """
+    Return a token that changes whenever the objects of `model` in `group`,
+    a dict of {attname: value} as returned by
+    `SortableOptions.get_group_filters`, are reordered.
+
+    The tokens are kept in the cache named by `ADMINSORTABLE_CACHE`, so
+    reading one doesn't read any row.
+    """
+    from adminsortable.utils import get_cache
+
+    cache = get_cache()
+    key = _get_order_version_key(model, group or {})
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+class GroupOrderVersions(object):
+    """
+    The order versions of the groups of `model` split by the field
+    `attname`, looked up by its value with `get` as they're needed, e.g.
+    while the sort view is rendered.
+    """
+
+    def __init__(self, model, attname):
+        self.model = model
+        self.attname = attname
+
+    def get(self, value, default=None):
+        return get_order_version(self.model, {self.attname: value})
+
+
+# the versions given to groups by the transactions still running in this
+# thread, by database alias and cache key
+_pending_order_versions = local()
+
+
+def bump_order_version(model, group, using):
+    """
+    Give `group` of `model` a new order version once the current
+    transaction on `using` commits, and return it. Bumping the same group
+    again before then returns the same version.
+    """
+    pending = _pending_order_versions.__dict__.setdefault(using, {})
+    key = _get_order_version_key(model, group)
+    version = pending.get(key)
+    if version is None:
+        version = pending[key] = uuid.uuid4().hex
+    transaction.on_commit(partial(_set_order_version, using, key, version),
+        using=using)
+    return version
+
+
+def _set_order_version(using, key, version):
+    from adminsortable.utils import get_cache
+
+    _pending_order_versions.__dict__.get(using, {}).pop(key, None)
+    get_cache().set(key, version, None)
+
+
+def get_group_filters(queryset, pk):
+    """
+    Return the filters selecting the group of the object `pk` of
+    `queryset`, see `SortableOptions.group_fields`.
+    """
+    group_fields = get_sortable_options(queryset.model).group_fields
+    if not group_fields:
+        return {}
+    values = queryset.filter(pk=pk).values_list(*group_fields).get()
+    return dict(zip(group_fields, values))
+
+
+def _check_order_version(group, group_filters, version):
+    if get_order_version(group.model, group_filters) != version:
+        raise ReorderConflict(u'The objects have been reordered since they '
+            'were read.', group, group_filters)
+
+
+# the error codes of failing to lock rows, or of being picked as the victim
+# of a deadlock: PostgreSQL SQLSTATEs and MySQL error numbers
+LOCK_FAILURE_CODES = ('55P03', '40P01', 1205, 1213, 3572)
+# and the messages of the backends that only tell it in words
+LOCK_FAILURE_MESSAGES = ('could not obtain lock', 'database is locked',
+    'database table is locked', 'ORA-00054')
+
+
+def is_lock_failure(error):
+    """
+    Return whether the OperationalError `error` was raised because rows or
+    tables were locked by another transaction: a `nowait` lock that isn't
+    available, a deadlock, or SQLite being busy.
+    """
+    cause = error.__cause__
+    code = getattr(cause, 'sqlstate', None) or \
+        getattr(cause, 'pgcode', None)
+    if code is None and getattr(cause, 'args', None):
+        code = cause.args[0]
+    if code in LOCK_FAILURE_CODES:
+        return True
+    message = str(error)
+    return any(text in message for text in LOCK_FAILURE_MESSAGES)
+
+
+def retry_on_lock_failure(func, retries=3, using=None):
+    """
+    Call `func` in a transaction and return its result. When it fails to
+    take a row lock, which `select_for_update(nowait=True)` reports at once,
+    retry it up to `retries` times, backing off a little longer each time,
+    and finally raise ReorderConflict. Other database errors are raised as
+    they are.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic(using=using):
+                return func()
+        except OperationalError as e:
+            if not is_lock_failure(e):
+                raise
+            if attempt == retries:
+                raise ReorderConflict(u'The objects are being reordered by '
+                    'someone else.')
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def has_reorder_receivers(model):
+    """
+    Return whether anything listens to the reorder signals of `model`, so
+    callers can skip collecting the old order values otherwise.
+    """
+    return pre_reorder.has_listeners(model) or \
+        post_reorder.has_listeners(model)
+
+
+def send_reorder_signals(model, group, changes, using):
+    """
+    Send `pre_reorder` now, before the new order values are written, and
+    `post_reorder` once the current transaction is committed. `changes` is
+    a list of (pk, old_order, new_order) tuples.
+    """
+    if not changes:
+        return
+    pre_reorder.send(sender=model, group=group, changes=changes, using=using)
+    transaction.on_commit(lambda: post_reorder.send(sender=model,
+        group=group, changes=changes, using=using), using=using)
+
+
+def _get_lock_key(value):
+    """
+    Return a signed 32 bit integer identifying `value`, for use as a
+    PostgreSQL advisory lock key.
+    """
+    key = zlib.crc32(force_bytes(value))
+    return key - (1 << 32) if key >= (1 << 31) else key
+
+
+def lock_order_group(model, group, using):
+    """
+    Serialize the allocation of new order values within `group`, a dict of
+    {attname: value} as returned by `SortableOptions.get_group_filters`,
+    until the current transaction ends.
+    """
+    lock_order_groups(model, [group], using)
+
+
+def lock_order_groups(model, groups, using):
+    """
+    Lock every group in `groups` until the current transaction ends. The
+    locks are always taken in the same order, so that two transactions
+    locking overlapping groups can't deadlock.
+
+    PostgreSQL takes a transaction level advisory lock per group. Other
+    backends lock the parent rows of the `SortableForeignKey`, or else the
+    row holding each group's highest order value. SQLite doesn't support row
+    locks, but only ever lets one transaction write at a time.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        keys = sorted(set(_get_lock_key(repr(sorted(group.items())))
+            for group in groups))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, key) '
+                'FROM unnest(%s) AS key', [
+                    _get_lock_key(model._meta.db_table), keys])
+        return
+
+    if not connection.features.has_select_for_update:
+        return
+
+    options = get_sortable_options(model)
+    field = options.sortable_foreign_key
+    if field is not None:
+        target = field.target_field.attname
+        parents = set(group.get(field.attname) for group in groups)
+        parents.discard(None)
+        if parents:
+            list(field.remote_field.model._base_manager.using(using)
+                .filter(**{'{0}__in'.format(target): parents})
+                .order_by(target).select_for_update()
+                .values_list('pk', flat=True))
+        groups = [group for group in groups
+            if group.get(field.attname) is None]
+
+    for group in groups:
+        list(model._base_manager.using(using).filter(**group).order_by(
+            '-{0}'.format(options.order_field_name))[:1]
+            .select_for_update().values_list('pk', flat=True))
+
+
+def _get_neighbour(queryset, order_field_name, order, following, descending):
+    """
+    Return the (pk, order) of the object directly following (or preceding)
+    `order` in display order, or None.
+    """
+    return _get_window(queryset, order_field_name, order, following,
+        descending, 0)[1]
+
+
+def _lock_neighbour(queryset, order_field_name, order, following,
+        descending, nowait=False):
+    """
+    Return the (pk, order) of the object directly following (or preceding)
+    `order` in display order, or None, once its row is locked. The lookup
+    is repeated when another object took its place while waiting for the
+    lock.
+    """
+    while True:
+        neighbour = _get_neighbour(queryset, order_field_name, order,
+            following, descending)
+        if neighbour is None:
+            return None
+        locked = queryset.filter(pk=neighbour[0]).select_for_update(
+            nowait=nowait).values_list('pk', order_field_name).first()
+        if locked is not None and locked == _get_neighbour(queryset,
+                order_field_name, order, following, descending):
+            return locked
+
+
+def _get_window(queryset, order_field_name, order, following, descending,
+        size):
+    """
+    Return up to `size` (pk, order) tuples following (or preceding) `order`
+    in display order, closest first, plus the tuple just outside the window.
+    """
+    if order is None:
+        return [], None
+    if following != descending:
+        lookup, order_by = 'gt', (order_field_name, 'pk')
+    else:
+        lookup, order_by = 'lt', ('-' + order_field_name, '-pk')
+    rows = list(queryset.filter(**{'{0}__{1}'.format(order_field_name,
+        lookup): order}).order_by(*order_by).values_list(
+            'pk', order_field_name)[:size + 1])
+    return rows[:size], (rows[size] if len(rows) > size else None)
+
+
+def _move_sparse(group, order_field_name, descending, gap, moved, lower,
+        upper):
+    """
+    Place `moved` between its new display neighbours `lower` and `upper`
+    and return the {pk: order} changes. Neighbours are only renumbered
+    when there is no free order value left between them.
+    """
+    sign = -1 if descending else 1
+    lowest, highest = get_order_field_range(
+        group.model._meta.get_field(order_field_name))
+
+    def key(row):
+        return sign * row[1] if row is not None else None
+
+    lower_key, upper_key, moved_key = key(lower), key(upper), key(moved)
+    if descending:
+        lowest_key = -highest if highest is not None else None
+        highest_key = -lowest
+    else:
+        lowest_key, highest_key = lowest, highest
+
+    if (lower_key is None or moved_key > lower_key) and \
+            (upper_key is None or moved_key < upper_key):
+        return {}
+
+    if lower_key is not None and upper_key is not None:
+        new_key = lower_key + (upper_key - lower_key) // 2
+    elif lower_key is not None:
+        new_key = lower_key + gap
+        if highest_key is not None and new_key > highest_key:
+            new_key = lower_key + (highest_key + 1 - lower_key) // 2
+    elif upper_key is not None:
+        new_key = upper_key - gap
+        if lowest_key is not None and new_key < lowest_key:
+            new_key = upper_key - (upper_key - lowest_key + 1) // 2
+    else:
+        new_key = moved_key
+
+    if (lower_key is None or new_key > lower_key) and \
+            (upper_key is None or new_key < upper_key):
+        return {moved[0]: sign * new_key}
+
+    # the gap is exhausted, rebalance a growing window around the move
+    others = group.exclude(pk=moved[0])
+    size = 8
+    while True:
+        before, outer_before = _get_window(others, order_field_name,
+            lower[1] if lower else None, False, descending, size - 1)
+        after, outer_after = _get_window(others, order_field_name,
+            upper[1] if upper else None, True, descending, size - 1)
+        sequence = list(reversed(before)) + ([lower] if lower else []) + \
+            [moved] + ([upper] if upper else []) + after
+
+        bounds = [lowest_key, highest_key]
+        if outer_before is not None:
+            bounds[0] = key(outer_before) + 1
+        if outer_after is not None:
+            bounds[1] = key(outer_after) - 1
+        if descending:
+            bounds = [-bounds[1], -bounds[0] if bounds[0] is not None
+                else None]
+
+        try:
+            return get_sparse_order(sequence, gap, descending=descending,
+                bounds=bounds)
+        except ValueError:
+            if outer_before is None and outer_after is None:
+                raise
+        size *= 2
+
+
+def _move_contiguous(group, group_filters, order_field_name, descending,
+        moved, lower, upper, version=None, nowait=False):
+    """
+    Place `moved` between its new display neighbours `lower` and `upper`
+    by shifting the objects between its old and new position by one, and
+    return the {pk: order} changes.
+    """
+    sign = -1 if descending else 1
+    moved_key = sign * moved[1]
+    others = group.exclude(pk=moved[0])
+
+    if lower is not None and sign * lower[1] >= moved_key:
+        # moving down the list, objects up to `lower` shift up by one
+        low, high, shift = moved_key, sign * lower[1], -1
+        new_key = high
+        key_range = (low, high, False, True)
+    elif upper is not None and sign * upper[1] <= moved_key:
+        # moving up the list, objects from `upper` shift down by one
+        low, high, shift = sign * upper[1], moved_key, 1
+        new_key = low
+        key_range = (low, high, True, False)
+    else:
+        return {}
+
+    low, high, include_low, include_high = key_range
+    if descending:
+        low, high = -high, -low
+        include_low, include_high = include_high, include_low
+    lookups = {
+        '{0}__{1}'.format(order_field_name, 'gte' if include_low else 'gt'):
+            low,
+        '{0}__{1}'.format(order_field_name, 'lte' if include_high else 'lt'):
+            high,
+    }
+    shifted = others.filter(**lookups)
+    rows = shifted if version is not None else \
+        shifted.select_for_update(nowait=nowait).order_by('pk')
+    previous = dict(rows.values_list('pk', order_field_name))
+    changes = {pk: order + sign * shift for pk, order in previous.items()}
+    previous[moved[0]], changes[moved[0]] = moved[1], sign * new_key
+    if version is not None:
+        _check_order_version(group, group_filters, version)
+    if has_reorder_receivers(group.model):
+        send_reorder_signals(group.model, group_filters, [(pk, previous[pk],
+            order) for pk, order in changes.items()], group.db)
+
+    if version is not None:
+        _write_order_if_unchanged(group, group_filters, order_field_name,
+            changes, previous)
+        return changes
+    shifted.update(**{order_field_name: F(order_field_name) + sign * shift})
+    group.filter(pk=moved[0]).update(**{order_field_name: sign * new_key})
+    return changes
+
+
+def _write_order_if_unchanged(group, group_filters, order_field_name,
+        changes, previous, neighbours=()):
+    """
+    Write `changes` to the rows that still have their `previous` order
+    values, or raise ReorderConflict.
+
+    The (pk, order) `neighbours` a sparse move was placed between are
+    rewritten with their own values, which locks them, so that another move
+    between them waits for this one to commit, and then finds its new
+    values taken.
+    """
+    written, expected = dict(changes), dict(previous)
+    for pk, order in neighbours:
+        if pk not in written:
+            written[pk] = expected[pk] = order
+    if write_order(group, order_field_name, written,
+            expected=expected) != len(written) or (neighbours and
+            group.filter(**{'{0}__in'.format(order_field_name):
+                list(changes.values())}).count() != len(changes)):
+        raise ReorderConflict(u'The objects have been reordered since they '
+            'were read.', group, group_filters)
+
+
+def move_object(queryset, pk, after=None, before=None, version=None,
+        nowait=False):
+    """
+    Move the object `pk` directly after the object `after` or, when
+    `after` is not given, directly before the object `before`, and return
+    a dict of {pk: order} for the objects whose order value changed.
+
+    `queryset` selects the objects being sorted. Objects are only ever
+    moved within their group, that of their `SortableForeignKey` or
+    `GenericForeignKey`, and only the rows
+    whose order value actually changes are written. The reorder signals are
+    sent for those rows.
+
+    The rows are locked in primary key order while they are moved, without
+    waiting for other transactions when `nowait` is True. When `version`,
+    the order version of the group as returned by `get_order_version`, is
+    given the move is optimistic instead: no rows are locked, and
+    ReorderConflict is raised if the group no longer has that version, or
+    if the rows change before they are written. Either way the group gets a
+    new order version, see `bump_order_version`.
+    """
+    model = queryset.model
+    options = get_sortable_options(model)
+    order_field_name, descending = options.order_field_name, options.descending
+    group_fields = options.group_fields
+    neighbour = after if after is not None else before
+    if neighbour is None:
+        raise ValueError(u'Either `after` or `before` must be given.')
+
+    with transaction.atomic(using=queryset.db):
+        rows = queryset if version is not None else \
+            queryset.select_for_update(nowait=nowait)
+        rows = {str(row[0]): row for row in rows
+            .filter(pk__in=[pk, neighbour]).order_by('pk')
+            .values_list('pk', order_field_name, *group_fields)}
+        try:
+            moved, neighbour = rows[str(pk)], rows[str(neighbour)]
+        except KeyError:
+            raise ObjectDoesNotExist(u'The objects to move could not be '
+                'found.')
+        if moved[2:] != neighbour[2:]:
+            raise ValueError(u'Objects can only be moved within their '
+                'own group.')
+
+        group_filters = dict(zip(group_fields, moved[2:]))
+        group = queryset.filter(**group_filters)
+        others = group.exclude(pk=moved[0])
+        moved, neighbour = moved[:2], neighbour[:2]
+        if moved[0] == neighbour[0]:
+            return {}
+
+        # without a version, the other neighbour is locked too, so that no
+        # other move can be placed between the two meanwhile
+        get_neighbour = _get_neighbour if version is not None else \
+            partial(_lock_neighbour, nowait=nowait)
+        if after is not None:
+            lower = neighbour
+            upper = get_neighbour(others, order_field_name, lower[1], True,
+                descending)
+        else:
+            upper = neighbour
+            lower = get_neighbour(others, order_field_name, upper[1], False,
+                descending)
+
+        gap = getattr(model, 'order_gap', None)
+        if gap and gap > 1:
+            changes = _move_sparse(group, order_field_name, descending, gap,
+                moved, lower, upper)
+            if not changes:
+                return changes
+            previous = {moved[0]: moved[1]}
+            if len(changes) > 1 and (version is not None or
+                    has_reorder_receivers(model)):
+                previous.update(group.filter(pk__in=list(changes))
+                    .values_list('pk', order_field_name))
+            if version is not None:
+                _check_order_version(group, group_filters, version)
+            if has_reorder_receivers(model):
+                send_reorder_signals(model, group_filters, [(pk,
+                    previous[pk], order) for pk, order in changes.items()],
+                    queryset.db)
+            if version is not None:
+                _write_order_if_unchanged(group, group_filters,
+                    order_field_name, changes, previous,
+                    [row for row in (lower, upper) if row is not None])
+            else:
+                write_order(group, order_field_name, changes)
+        else:
+            changes = _move_contiguous(group, group_filters,
+                order_field_name, descending, moved, lower, upper,
+                version=version, nowait=nowait)
+        if changes:
+            bump_order_version(model, group_filters, queryset.db)
+    return changes
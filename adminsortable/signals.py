@@ -0,0 +1,17 @@
+from django.dispatch import Signal
+
+# Sent when objects are reordered, by the `do_sorting` view and by
+# `adminsortable.ordering.move_object`, with the sortable model as the
+# sender and these arguments:
+#
+# `group`: the filters selecting the reordered group, e.g.
+#     {'category_id': 3}, or {} when the model isn't grouped
+# `changes`: a list of (pk, old_order, new_order) tuples, one for every
+#     object whose order value changed
+# `using`: the database alias
+#
+# `pre_reorder` is sent inside the transaction, before the new order values
+# are written. `post_reorder` is sent once that transaction is committed, and
+# not at all if it is rolled back.
+pre_reorder = Signal()
+post_reorder = Signal()
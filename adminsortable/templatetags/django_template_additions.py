@@ -76,6 +76,15 @@ def dynamic_regroup(parser, token):
     return DynamicRegroupNode(target, parser, expression, var_name)
 
 
+@register.filter
+def get_order_version(order_versions, key):
+    """
+    Return the order version of the group `key` from the `order_versions`
+    of the sort view.
+    """
+    return order_versions.get(key, '')
+
+
 @register.simple_tag
 def get_django_version():
     version = django.VERSION
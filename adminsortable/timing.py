@@ -0,0 +1,102 @@
+import logging
+import time
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('adminsortable')
+
+
+class RequestTimer(object):
+    """
+    Record how long the phases of a request take and how many queries each
+    of them runs. A phase ends when `lap` is called with its name.
+    """
+
+    def __init__(self, name, using=DEFAULT_DB_ALIAS):
+        self.name = name
+        self.connection = connections[using]
+        self.phases = []
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.connection.execute_wrappers.append(self)
+        self.started = self.last = time.perf_counter()
+        self.last_queries = 0
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.execute_wrappers.remove(self)
+        self.duration = time.perf_counter() - self.started
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last,
+            self.queries - self.last_queries))
+        self.last, self.last_queries = now, self.queries
+
+    def get_server_timing(self):
+        """
+        Return the phases as the value of a `Server-Timing` header, which
+        browsers show along with the request in their developer tools.
+        """
+        return ', '.join('{0};dur={1:.1f};desc="{2} queries"'.format(
+            name, duration * 1000, queries) for name, duration, queries in
+            self.phases + [('total', self.duration, self.queries)])
+
+    def __str__(self):
+        return '{0}: {1:.1f}ms, {2} queries ({3})'.format(self.name,
+            self.duration * 1000, self.queries, ', '.join(
+                '{0} {1:.1f}ms/{2}'.format(name, duration * 1000, queries)
+                for name, duration, queries in self.phases))
+
+
+class NullTimer(object):
+    def lap(self, name):
+        pass
+
+
+def get_request_timer(request):
+    """
+    Return the timer of the `timed_view` handling `request`, or a timer that
+    records nothing when timing is disabled.
+    """
+    return getattr(request, '_adminsortable_timer', None) or NullTimer()
+
+
+def timed_view(view_func):
+    """
+    Decorate an admin view method to record its phases when the admin sets
+    `sortable_timing` or `sortable_query_budget`. Template responses are
+    rendered by the view, so that rendering is part of the timing.
+    """
+    @wraps(view_func)
+    def _timed_view(self, request, *args, **kwargs):
+        if not self.sortable_timing and self.sortable_query_budget is None:
+            return view_func(self, request, *args, **kwargs)
+
+        timer = RequestTimer('{0} {1}'.format(self.model._meta.label_lower,
+            view_func.__name__))
+        request._adminsortable_timer = timer
+        with timer:
+            response = view_func(self, request, *args, **kwargs)
+            if not timer.phases:
+                timer.lap('view')
+            if hasattr(response, 'render') and \
+                    not getattr(response, 'is_rendered', True):
+                response.render()
+                timer.lap('render')
+
+        if self.sortable_timing:
+            response['Server-Timing'] = timer.get_server_timing()
+            logger.info('%s', timer)
+        if self.sortable_query_budget is not None and \
+                timer.queries > self.sortable_query_budget:
+            logger.warning('%s exceeds the query budget of %d queries.',
+                timer, self.sortable_query_budget)
+        return response
+    return _timed_view
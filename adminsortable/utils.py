@@ -1,3 +1,10 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.utils.encoding import force_bytes
+
 from .models import SortableMixin, SortableForeignKey
 
 
@@ -6,13 +13,11 @@ def check_inheritance(cls):
 
 
 def get_is_sortable(objects):
-    if objects.count() < 2:
+    # fetch at most two primary keys instead of counting every object
+    if not issubclass(objects.model, SortableMixin):
         return False
 
-    if not check_inheritance(objects[:1][0]):
-        return False
-
-    return True
+    return len(objects.order_by().values_list('pk', flat=True)[:2]) == 2
 
 
 def is_self_referential(cls):
@@ -33,3 +38,66 @@ def check_model_is_sortable(cls):
                 objects = cls.objects
             return get_is_sortable(objects.all())
     return False
+
+
+def get_cache():
+    return caches[getattr(settings, 'ADMINSORTABLE_CACHE', DEFAULT_CACHE_ALIAS)]
+
+
+def _get_model_version_key(model):
+    return 'adminsortable:version:{0}'.format(model._meta.label_lower)
+
+
+def get_model_version(model):
+    """
+    Return a token that changes whenever `bump_model_version` is called for
+    `model`, to be included in the keys of cached values derived from it.
+    """
+    cache = get_cache()
+    key = _get_model_version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_model_version(sender, **kwargs):
+    """
+    Invalidate the cached values derived from `sender`. Connected to
+    `post_save` and `post_delete` by admins that cache.
+    """
+    get_cache().delete(_get_model_version_key(sender))
+
+
+def get_queryset_cache_key(prefix, queryset, *parts):
+    """
+    Return a cache key identifying the objects `queryset` selects, and any
+    other `parts` the cached value depends on. Raises `EmptyResultSet` when
+    the queryset can't select any object.
+    """
+    query = ':'.join([queryset.model._meta.label_lower, str(queryset.query)] +
+        [str(part) for part in parts])
+    return 'adminsortable:{0}:{1}'.format(prefix,
+        hashlib.md5(force_bytes(query)).hexdigest())
+
+
+def get_sortable_models(labels=()):
+    """
+    Return the concrete sortable models named by `labels`, given as
+    `app_label` or `app_label.ModelName`, or all of them when no labels are
+    given. Raises `LookupError` for unknown labels.
+    """
+    from django.apps import apps
+
+    models = []
+    if not labels:
+        models = apps.get_models()
+    for label in labels:
+        if '.' in label:
+            models.append(apps.get_model(label))
+        else:
+            models.extend(apps.get_app_config(label).get_models())
+
+    return [model for model in models if issubclass(model, SortableMixin)
+        and not model._meta.proxy and not model._meta.swapped]
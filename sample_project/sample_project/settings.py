@@ -29,6 +29,19 @@ DATABASES = {
     }
 }
 
+# Set POSTGRES_DB (and optionally POSTGRES_USER, POSTGRES_PASSWORD,
+# POSTGRES_HOST and POSTGRES_PORT) to run the sample project, its tests and
+# its benchmarks against a local PostgreSQL server instead
+if os.environ.get('POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['POSTGRES_DB'],
+        'USER': os.environ.get('POSTGRES_USER', ''),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', ''),
+        'PORT': os.environ.get('POSTGRES_PORT', ''),
+    }
+
 # Hosts/domain names that are valid for this site; required if DEBUG is False
 # See https://docs.djangoproject.com/en/1.5/ref/settings/#allowed-hosts
 ALLOWED_HOSTS = []
@@ -3,7 +3,6 @@ from django.contrib import admin
 from adminsortable.admin import (SortableAdmin, SortableTabularInline,
     SortableStackedInline, SortableGenericStackedInline,
     NonSortableParentAdmin)
-from adminsortable.utils import get_is_sortable
 from .models import (Category, Widget, Project, Credit, Note, GenericNote,
     Component, Person, NonSortableCategory, SortableCategoryWidget,
     SortableNonInlineCategory, NonSortableCredit, NonSortableNote,
@@ -29,7 +28,7 @@ class ComponentInline(SortableStackedInline):
     def get_queryset(self, request):
         qs = super(ComponentInline, self).get_queryset(
             request).exclude(title__icontains='2')
-        if get_is_sortable(qs):
+        if self.get_is_sortable(request, qs):
             self.model.is_sortable = True
         else:
             self.model.is_sortable = False
@@ -0,0 +1,168 @@
+"""
+Helpers shared by the `sortable_benchmark` and `sortable_loadtest`
+management commands: a throwaway test database, seeding it with sample
+objects and measuring a piece of code.
+"""
+import contextlib
+import io
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.client import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from .models import Category, Project
+
+
+@contextlib.contextmanager
+def test_database(keepdb=False, sqlite_file=None):
+    """
+    Run the enclosed code against a freshly created test database, so that
+    the development database is never touched.
+
+    SQLite test databases live in memory, which other threads can't write
+    to concurrently; pass `sqlite_file` to create the test database in that
+    file instead.
+    """
+    if sqlite_file and connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = sqlite_file
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0,
+        autoclobber=True, serialize=False, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0,
+            keepdb=keepdb)
+        teardown_test_environment()
+
+
+def seed(size, groups=10, batch_size=1000):
+    """
+    Replace the sample objects with `size` categories, and `size` projects
+    spread over the first `groups` categories.
+    """
+    Project.objects.all().delete()
+    Category.objects.all().delete()
+
+    Category.objects.bulk_create([
+        Category(title='Category {0}'.format(i), order=i)
+        for i in range(1, size + 1)], batch_size=batch_size)
+
+    categories = list(Category.objects.order_by('order')[:groups])
+    Project.objects.bulk_create([
+        Project(category=categories[i % len(categories)],
+            title='Project {0}'.format(i), description='')
+        for i in range(size)], batch_size=batch_size)
+
+
+def seed_groups(groups, group_size, batch_size=1000):
+    """
+    Replace the sample objects with `groups` categories of `group_size`
+    projects each, and return the categories.
+    """
+    Project.objects.all().delete()
+    Category.objects.all().delete()
+
+    Category.objects.bulk_create([
+        Category(title='Category {0}'.format(i), order=i)
+        for i in range(1, groups + 1)])
+    categories = list(Category.objects.order_by('order'))
+    Project.objects.bulk_create([
+        Project(category=category, title='Project {0}'.format(i),
+            description='')
+        for category in categories for i in range(group_size)],
+        batch_size=batch_size)
+    return categories
+
+
+def get_admin_client(**kwargs):
+    """
+    Return a test client logged in as a superuser.
+    """
+    user = User.objects.filter(username='benchmark').first() or \
+        User.objects.create_superuser('benchmark', 'benchmark@example.com',
+            'benchmark')
+    client = Client(**kwargs)
+    client.force_login(user)
+    return client
+
+
+def ajax_post(client, url, data):
+    # keep the sample admins' after_sorting output out of the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.post(url, data=data,
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+    if response.status_code != 200:
+        raise AssertionError('{0} returned {1}: {2}'.format(url,
+            response.status_code, response.content[:200]))
+    return response
+
+
+def percentile(values, fraction):
+    """
+    Return the value below which `fraction` of the sorted `values` fall.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class QueryCounter(object):
+    """
+    Count the queries run on a connection. Unlike `CaptureQueriesContext`,
+    this keeps counting across test client requests, which reset the query
+    log when they start.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def rolled_back(func):
+    """
+    Return a function calling `func` in a transaction that is rolled back,
+    so that paths adding objects leave the seeded objects as they were for
+    the next run and the next path.
+    """
+    def run():
+        with transaction.atomic():
+            func()
+            transaction.set_rollback(True)
+    return run
+
+
+def measure(func, repeat=3):
+    """
+    Call `func` `repeat` times and return the wall time, the number of
+    queries and, from one extra call, the peak memory allocated by Python.
+    """
+    timings = []
+    for i in range(repeat):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'time_min': min(timings),
+        'time_median': statistics.median(timings),
+        'queries': counter.count,
+        'peak_memory_kb': peak // 1024,
+    }
@@ -0,0 +1,159 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from adminsortable.utils import get_is_sortable
+
+from ...benchmarks import (ajax_post, get_admin_client, measure,
+                           rolled_back, seed, test_database)
+from ...models import Category, Project
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the sorting hot paths on a throwaway test database '
+        'seeded with sample objects, and writes the wall time, query count '
+        'and peak memory of each as JSON.')
+
+    paths = ('save', 'bulk_create', 'get_next', 'with_neighbours',
+        'get_is_sortable', 'sort_view', 'sort_view_grouped', 'move',
+        'indexes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+            help='Comma separated numbers of objects to seed '
+                 '(default: 1000,10000,100000).')
+        parser.add_argument('--groups', type=int, default=10,
+            help='Number of categories the projects are spread over '
+                 '(default: 10).')
+        parser.add_argument('--paths', default=','.join(self.paths),
+            help='Comma separated hot paths to measure (default: all of '
+                 '{0}).'.format(', '.join(self.paths)))
+        parser.add_argument('--repeat', type=int, default=3,
+            help='Number of timed runs per path (default: 3).')
+        parser.add_argument('--output',
+            help='Write the results to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be a list of numbers.')
+        paths = options['paths'].split(',')
+        unknown = set(paths) - set(self.paths)
+        if unknown:
+            raise CommandError('Unknown paths: {0}'.format(
+                ', '.join(sorted(unknown))))
+
+        results = []
+        with test_database():
+            client = get_admin_client()
+            for size in sizes:
+                self.stderr.write('Seeding {0} objects...'.format(size))
+                seed(size, groups=options['groups'])
+                for path in paths:
+                    func = getattr(self, 'get_{0}'.format(path))(client)
+                    result = measure(func, repeat=options['repeat'])
+                    result.update({'path': path, 'size': size})
+                    results.append(result)
+                    self.stderr.write('  {path}: {time_median:.4f}s, '
+                        '{queries} queries, {peak_memory_kb} KiB'.format(
+                            **result))
+
+            output = json.dumps({
+                'meta': {
+                    'date': datetime.now(timezone.utc).isoformat(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': connection.vendor,
+                    'database_version': '.'.join(str(part) for part in
+                        connection.get_database_version()),
+                    'groups': options['groups'],
+                    'repeat': options['repeat'],
+                },
+                'results': results,
+            }, indent=2)
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
+
+    # each method returns the function that runs one pass of the hot path
+
+    def get_save(self, client):
+        def run():
+            for i in range(100):
+                Category.objects.create(title='Saved')
+        return rolled_back(run)
+
+    def get_bulk_create(self, client):
+        categories = list(Category.objects.order_by('order')[:10])
+
+        def run():
+            Project.objects.bulk_create([
+                Project(category=categories[i % len(categories)],
+                    title='Bulk', description='') for i in range(1000)])
+        return rolled_back(run)
+
+    def get_get_next(self, client):
+        count = Project.objects.count()
+        projects = list(Project.objects.order_by('order')[
+            count // 2:count // 2 + 50])
+
+        def run():
+            for project in projects:
+                project.get_next()
+                project.get_previous()
+        return run
+
+    def get_with_neighbours(self, client):
+        count = Project.objects.count()
+
+        def run():
+            list(Project.objects.with_neighbours().order_by(
+                'category', 'order')[count // 2:count // 2 + 50])
+        return run
+
+    def get_get_is_sortable(self, client):
+        def run():
+            get_is_sortable(Category.objects.all())
+        return run
+
+    def get_sort_view(self, client):
+        def run():
+            client.get('/admin/samples/category/sort/')
+        return run
+
+    def get_sort_view_grouped(self, client):
+        def run():
+            client.get('/admin/samples/project/sort/')
+        return run
+
+    def get_move(self, client):
+        # moving the last object to the top renumbers every object
+        url = '/admin/samples/category/sort/do-sorting/{0}/'.format(
+            Category.model_type_id())
+
+        def run():
+            first, last = Category.objects.order_by('order')[0], \
+                Category.objects.order_by('-order')[0]
+            ajax_post(client, url, {'moved': last.pk, 'before': first.pk})
+        return run
+
+    def get_indexes(self, client):
+        # post the reversed order of a group of projects
+        url = '/admin/samples/project/sort/do-sorting/{0}/'.format(
+            Project.model_type_id())
+        category_id = Project.objects.values_list('category', flat=True)[0]
+
+        def run():
+            pks = Project.objects.filter(category=category_id).order_by(
+                '-order').values_list('pk', flat=True)
+            ajax_post(client, url, {'indexes': ','.join(
+                str(pk) for pk in pks)})
+        return run
@@ -0,0 +1,232 @@
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from unittest import mock
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Count
+
+from adminsortable.ordering import get_order_version, is_lock_failure
+
+from ...benchmarks import get_admin_client, percentile, seed_groups, test_database
+from ...models import Project
+
+
+class LockTimer(object):
+    """
+    Add up the time a connection spends waiting for locks: in the
+    statements that wait for them, `SELECT ... FOR UPDATE` and PostgreSQL
+    advisory locks, in the statements that fail to take them, which on
+    SQLite wait for the busy database until its timeout, and in the back-off
+    before a reorder that failed is retried.
+    """
+
+    # the timer of the request each editor thread is posting
+    current = threading.local()
+
+    def __init__(self):
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        except OperationalError as e:
+            if is_lock_failure(e):
+                self.total += time.perf_counter() - start
+            raise
+        if 'FOR UPDATE' in sql or 'pg_advisory' in sql:
+            self.total += time.perf_counter() - start
+        return result
+
+    @classmethod
+    def sleep(cls, seconds, sleep=time.sleep):
+        """
+        Stand-in for the `time.sleep` of the retries of
+        `adminsortable.ordering.retry_on_lock_failure`.
+        """
+        timer = getattr(cls.current, 'timer', None)
+        if timer is not None:
+            timer.total += seconds
+        sleep(seconds)
+
+
+class Command(BaseCommand):
+    help = ('Simulates editors concurrently reordering the same groups of '
+        'projects through the do_sorting view, on a throwaway test database, '
+        'and reports throughput, latency, time spent waiting for locks and '
+        'failed requests.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--editors', type=int, default=8,
+            help='Number of concurrent editors (threads) (default: 8).')
+        parser.add_argument('--requests', type=int, default=50,
+            help='Number of reorders per editor (default: 50).')
+        parser.add_argument('--groups', type=int, default=1,
+            help='Number of groups the editors reorder (default: 1).')
+        parser.add_argument('--group-size', type=int, default=200,
+            help='Number of projects per group (default: 200).')
+        parser.add_argument('--pattern', default='random',
+            choices=['random', 'top', 'adjacent'],
+            help='random: move any object anywhere; top: move any object to '
+                 'the top of the group; adjacent: swap an object with its '
+                 'neighbour (default: random).')
+        parser.add_argument('--payload', default='move',
+            choices=['move', 'indexes'],
+            help='Post single-object moves or the complete order of the '
+                 'group (default: move).')
+        parser.add_argument('--optimistic', action='store_true',
+            help='Turn on sort_view_optimistic and post the order version '
+                 'of the group with every move.')
+        parser.add_argument('--seed', type=int, default=None,
+            help='Seed for the random moves.')
+        parser.add_argument('--output',
+            help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        if options['editors'] < 1 or options['requests'] < 1 or \
+                options['groups'] < 1 or options['group_size'] < 2:
+            raise CommandError('--editors, --requests and --groups must be '
+                'positive and --group-size at least 2.')
+
+        # threads can't share an in-memory SQLite database
+        sqlite_file = os.path.join(tempfile.mkdtemp(), 'loadtest.sqlite3')
+        with test_database(sqlite_file=sqlite_file):
+            categories = seed_groups(options['groups'], options['group_size'])
+            get_admin_client()
+            connection.close()
+
+            records = []
+            barrier = threading.Barrier(options['editors'])
+            threads = [threading.Thread(target=self.editor, args=(
+                random.Random(None if options['seed'] is None
+                    else options['seed'] + i),
+                categories, barrier, records, options))
+                for i in range(options['editors'])]
+
+            # keep the sample admins' after_sorting output, and the tracebacks
+            # of failed requests (which are counted), out of the results
+            request_logger = logging.getLogger('django.request')
+            request_logger.disabled = True
+            try:
+                with contextlib.redirect_stdout(io.StringIO()), \
+                        mock.patch.object(admin.site._registry[Project],
+                            'sort_view_optimistic', options['optimistic']), \
+                        mock.patch('adminsortable.ordering.time.sleep',
+                            LockTimer.sleep):
+                    start = time.perf_counter()
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                    elapsed = time.perf_counter() - start
+            finally:
+                request_logger.disabled = False
+
+            duplicates = Project.objects.values('category', 'order') \
+                .annotate(count=Count('pk')).filter(count__gt=1).count()
+            result = self.summarize(records, elapsed, duplicates, options)
+
+        self.stderr.write(
+            '{requests} requests in {elapsed:.2f}s: {throughput:.1f} req/s, '
+            'p50 {latency_p50_ms:.1f}ms, p99 {latency_p99_ms:.1f}ms, '
+            'lock wait p99 {lock_wait_p99_ms:.1f}ms, {failed} failed, '
+            '{duplicate_orders} duplicate order values.'.format(**result))
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def editor(self, rng, categories, barrier, records, options):
+        client = get_admin_client(raise_request_exception=False)
+        url = '/admin/samples/project/sort/do-sorting/{0}/'.format(
+            Project.model_type_id())
+        barrier.wait()
+
+        try:
+            for i in range(options['requests']):
+                category = rng.choice(categories)
+                group = Project.objects.filter(category=category)
+                pks = list(group.order_by('order').values_list('pk',
+                    flat=True))
+                data = self.get_payload(rng, pks, options)
+                if options['optimistic']:
+                    data['version'] = get_order_version(Project,
+                        {'category_id': category.pk})
+
+                timer = LockTimer.current.timer = LockTimer()
+                with connection.execute_wrapper(timer):
+                    start = time.perf_counter()
+                    try:
+                        status = client.post(url, data=data,
+                            HTTP_X_REQUESTED_WITH='XMLHttpRequest').status_code
+                    except Exception as e:
+                        status = e.__class__.__name__
+                    latency = time.perf_counter() - start
+                records.append((latency, timer.total, status))
+        finally:
+            connection.close()
+
+    def get_payload(self, rng, pks, options):
+        index = rng.randrange(len(pks))
+        if options['pattern'] == 'top':
+            target = 0
+        elif options['pattern'] == 'adjacent':
+            target = index - 1 if index else 1
+        else:
+            target = rng.randrange(len(pks))
+        if target == index:
+            target = (index + 1) % len(pks)
+
+        if options['payload'] == 'indexes':
+            order = list(pks)
+            order.insert(target, order.pop(index))
+            return {'indexes': ','.join(str(pk) for pk in order)}
+
+        # move the object to `target`, next to the object currently there
+        if target < index:
+            return {'moved': pks[index], 'before': pks[target]}
+        return {'moved': pks[index], 'after': pks[target]}
+
+    def summarize(self, records, elapsed, duplicates, options):
+        latencies = [latency for latency, lock_wait, status in records]
+        lock_waits = [lock_wait for latency, lock_wait, status in records]
+        failures = {}
+        for latency, lock_wait, status in records:
+            if status != 200:
+                failures[str(status)] = failures.get(str(status), 0) + 1
+
+        def ms(value):
+            return value * 1000 if value is not None else None
+
+        return {
+            'database': connection.vendor,
+            'editors': options['editors'],
+            'groups': options['groups'],
+            'group_size': options['group_size'],
+            'pattern': options['pattern'],
+            'payload': options['payload'],
+            'optimistic': options['optimistic'],
+            'requests': len(records),
+            'elapsed': elapsed,
+            'throughput': len(records) / elapsed if elapsed else None,
+            'latency_p50_ms': ms(percentile(latencies, 0.5)),
+            'latency_p99_ms': ms(percentile(latencies, 0.99)),
+            'latency_max_ms': ms(max(latencies) if latencies else None),
+            'lock_wait_total_ms': ms(sum(lock_waits)),
+            'lock_wait_p99_ms': ms(percentile(lock_waits, 0.99)),
+            'failed': sum(failures.values()),
+            'failures': failures,
+            'duplicate_orders': duplicates,
+        }
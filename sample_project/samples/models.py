@@ -5,7 +5,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
 from adminsortable.fields import SortableForeignKey
-from adminsortable.models import Sortable, SortableMixin
+from adminsortable.models import Sortable, SortableManager, SortableMixin
 
 
 class SimpleModel(models.Model):
@@ -51,6 +51,8 @@ class Project(SimpleModel, SortableMixin):
 
     order = models.PositiveIntegerField(default=0, editable=False)
 
+    objects = SortableManager()
+
     def get_next(self):
         return super(Project, self).get_next(
             filter_args=[models.Q(isApproved=True) | models.Q(isFunded=True)])
@@ -4,17 +4,40 @@ except ImportError:
     import http.client as httplib  # Python 3
 
 import json
+from io import StringIO
+from unittest import mock, skipUnless
 
 import django
 
-from django.contrib.auth.models import User
-from django.db import models
-from django.test import TestCase
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, models
+from django.test import RequestFactory, TestCase
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
 
-from adminsortable.models import SortableMixin
+from adminsortable import admin as admin_module, ordering
+from adminsortable.admin import SortableAdmin
+from adminsortable.models import SortableMixin, SortableQuerySet
+from adminsortable.options import get_sortable_options
+from adminsortable.ordering import (ReorderConflict, get_order_version,
+    get_order_writer, get_sparse_order, move_object, retry_on_lock_failure,
+    write_order, write_order_case, write_order_values)
+from adminsortable.signals import post_reorder, pre_reorder
 from adminsortable.utils import get_is_sortable
-from .models import Category, Person, Project, TestNonAutoFieldModel
+
+if django.VERSION >= (4, 1):
+    from asgiref.sync import async_to_sync
+    from django.test import AsyncRequestFactory
+
+from .models import (Category, GenericNote, Person, Project,
+    TestNonAutoFieldModel)
+
+
+# tests that run on_commit callbacks need captureOnCommitCallbacks
+requires_on_commit_capture = skipUnless(django.VERSION >= (3, 2),
+    '`captureOnCommitCallbacks` requires Django 3.2 or higher.')
 
 
 class SortableTestCase(TestCase):
@@ -82,6 +105,45 @@ class SortableTestCase(TestCase):
         self.assertTrue(get_is_sortable(Category.objects.all()),
             'Category has more than one record. It should be sortable.')
 
+    def test_is_sortable_probes_two_rows(self):
+        for title in ('Category 1', 'Category 2', 'Category 3'):
+            self.create_category(title=title)
+
+        with self.assertNumQueries(1) as context:
+            self.assertTrue(get_is_sortable(Category.objects.all()))
+        self.assertIn('LIMIT 2', context.captured_queries[0]['sql'])
+        self.assertNotIn('COUNT', context.captured_queries[0]['sql'])
+
+    def test_admin_is_sortable_cached_per_request(self):
+        self.create_category()
+        self.create_category(title='Category 2')
+        request = RequestFactory().get('/')
+        category_admin = admin.site._registry[Category]
+
+        with self.assertNumQueries(1):
+            self.assertTrue(category_admin.get_is_sortable(request,
+                Category.objects.all()))
+            self.assertTrue(category_admin.get_is_sortable(request,
+                Category.objects.all()))
+
+    def test_admin_is_sortable_cache_invalidated_on_save(self):
+        class CachedCategoryAdmin(SortableAdmin):
+            sortable_cache_timeout = 60
+
+        category_admin = CachedCategoryAdmin(Category, admin.site)
+        self.create_category()
+
+        with self.assertNumQueries(1):
+            self.assertFalse(category_admin.get_is_sortable(
+                RequestFactory().get('/'), Category.objects.all()))
+        with self.assertNumQueries(0):
+            self.assertFalse(category_admin.get_is_sortable(
+                RequestFactory().get('/'), Category.objects.all()))
+
+        self.create_category(title='Category 2')
+        self.assertTrue(category_admin.get_is_sortable(
+            RequestFactory().get('/'), Category.objects.all()))
+
     def test_doesnt_overwrite_preexisting_order_field_value(self):
         self.create_category()
         category = Category.objects.create(title='Category 2', order=5)
@@ -242,6 +304,30 @@ class SortableTestCase(TestCase):
         self.assertEqual(response.status_code, httplib.OK,
             'Unable to reach sort view.')
 
+    def test_adminsortable_sort_view_selects_sortable_fk(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+
+        def get_query_count():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/admin/samples/project/sort/')
+            self.assertEqual(response.status_code, httplib.OK)
+            return len(context.captured_queries)
+
+        for i in range(2):
+            for category in (category1, category2):
+                Project.objects.create(category=category, description='foo')
+        # the first request also fills the content type cache
+        get_query_count()
+        query_count = get_query_count()
+
+        for i in range(5):
+            for category in (category1, category2):
+                Project.objects.create(category=category, description='foo')
+        self.assertEqual(get_query_count(), query_count)
+
     def test_adminsortable_change_list_view_permission_denied(self):
         category1 = self.create_category(title='Category 3')
         Project.objects.create(category=category1, description="foo")
@@ -297,6 +383,1067 @@ class SortableTestCase(TestCase):
         ]
         self.assertEqual(notes, expected_notes)
 
+    def test_adminsortable_sorting_url_resolved_once(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        self.make_test_categories()
+        sorting_url = '/admin/samples/category/sort/do-sorting/{0}/'.format(
+            Category.model_type_id())
+
+        with mock.patch('adminsortable.admin.reverse',
+                wraps=admin_module.reverse) as reverse:
+            response = self.client.get('/admin/samples/category/sort/')
+
+        # once for the sorting URL and once for the batch sorting URL
+        self.assertEqual(reverse.call_count, 2)
+        self.assertEqual(response.context['sorting_url'], sorting_url)
+        self.assertContains(response, 'href="{0}"'.format(sorting_url),
+            count=3)
+
+    def test_adminsortable_inline_sorting_url(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        project = Project.objects.create(category=self.create_category(),
+            description='Test project')
+        project.note_set.create(text='note 1')
+        project.note_set.create(text='note 2')
+
+        response = self.client.get(
+            '/admin/samples/project/{0}/change/'.format(project.pk))
+
+        self.assertContains(response,
+            'name="admin_sorting_url" value="{0}"'.format(
+                self.get_sorting_url(project.note_set.model)), count=2)
+
     def test_save_non_auto_field_model(self):
         model = TestNonAutoFieldModel()
         model.save()
+
+    def test_save_order_incremented_by_order_gap(self):
+        with mock.patch.object(Category, 'order_gap', 100):
+            category1 = self.create_category()
+            category2 = self.create_category(title='Category 2')
+
+        self.assertEqual(category1.order, 100)
+        self.assertEqual(category2.order, 200)
+
+    def test_save_order_scoped_to_sortable_foreign_key(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        projects = [Project.objects.create(category=category, description='foo')
+            for category in (category1, category2, category1, category2)]
+
+        self.assertEqual([project.order for project in projects],
+            [1, 1, 2, 2])
+
+    def test_save_order_scoped_to_generic_foreign_key(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        notes = [GenericNote.objects.create(content_object=category,
+                title='Note') for category in (category1, category1, category2)]
+
+        self.assertEqual([note.order for note in notes], [1, 2, 1])
+
+    def test_move_scoped_to_generic_foreign_key(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        note1, note2, note3, note4 = [GenericNote.objects.create(
+            content_object=category, title='Note') for category in
+            (category1, category1, category2, category2)]
+
+        move_object(GenericNote.objects.all(), note2.pk, before=note1.pk)
+
+        self.assertEqual(dict(GenericNote.objects.values_list('pk', 'order')),
+            {note1.pk: 2, note2.pk: 1, note3.pk: 1, note4.pk: 2})
+        with self.assertRaises(ValueError):
+            move_object(GenericNote.objects.all(), note3.pk, after=note1.pk)
+
+        notes = SortableQuerySet(GenericNote).with_neighbours().order_by('pk')
+        self.assertEqual([(note.previous_pk, note.next_pk) for note in notes],
+            [(note2.pk, None), (None, note1.pk), (None, note4.pk),
+             (note3.pk, None)])
+        self.assertEqual(GenericNote.objects.get(pk=note3.pk).get_next(),
+            note4)
+
+    def test_save_locks_order_group(self):
+        category = self.create_category()
+        with mock.patch('adminsortable.models.lock_order_group') as lock:
+            Project.objects.create(category=category, description='foo')
+
+        lock.assert_called_once_with(Project, {'category_id': category.pk},
+            'default')
+
+    def test_bulk_create_assigns_order_per_group(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        Project.objects.create(category=category1, description='foo')
+
+        with self.assertNumQueries(4):
+            projects = Project.objects.bulk_create([
+                Project(category=category, description='foo')
+                for category in (category1, category2, category1, category2)
+            ] + [Project(category=category1, description='foo', order=10)])
+
+        self.assertEqual([project.order for project in projects],
+            [2, 1, 3, 2, 10])
+        self.assertEqual(list(Project.objects.filter(category=category1)
+            .values_list('order', flat=True)), [1, 2, 3, 10])
+
+    def test_bulk_create_order_gap(self):
+        category = self.create_category()
+        with mock.patch.object(Project, 'order_gap', 100):
+            projects = Project.objects.bulk_create([
+                Project(category=category, description='foo')
+                for i in range(3)])
+
+        self.assertEqual([project.order for project in projects],
+            [100, 200, 300])
+
+    def test_with_neighbours(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        project1, project2, project3, project4 = [
+            Project.objects.create(category=category, description='foo')
+            for category in (category1, category2, category1, category1)]
+
+        with self.assertNumQueries(1):
+            projects = list(Project.objects.with_neighbours().order_by('pk'))
+
+        self.assertEqual(
+            [(project.previous_pk, project.next_pk, project.position,
+                project.group_size) for project in projects],
+            [(None, project3.pk, 1, 3), (None, None, 1, 1),
+                (project1.pk, project4.pk, 2, 3), (project3.pk, None, 3, 3)])
+        for project in projects:
+            previous = project.get_previous()
+            self.assertEqual(project.previous_pk,
+                previous.pk if previous else None)
+
+    def test_with_neighbours_ignoring_sortable_fk(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        project1, project2 = [
+            Project.objects.create(category=category, description='foo')
+            for category in (category1, category2)]
+
+        projects = Project.objects.with_neighbours(
+            filter_on_sortable_fk=False).order_by('order', 'pk')
+
+        self.assertEqual(
+            [(project.previous_pk, project.next_pk, project.group_size)
+                for project in projects],
+            [(None, project2.pk, 2), (project1.pk, None, 2)])
+
+    def apply_order_changes(self, sequence, changes):
+        orders = dict(sequence)
+        orders.update(changes)
+        return [pk for pk, order in sorted(orders.items(),
+            key=lambda item: item[1])]
+
+    def test_sparse_order_moves_single_object(self):
+        sequence = [(5, 500), (1, 100), (2, 200), (3, 300), (4, 400)]
+        self.assertEqual(get_sparse_order(sequence, 100), {5: 50})
+
+        sequence = [(1, 100), (2, 200), (4, 400), (3, 300), (5, 500)]
+        changes = get_sparse_order(sequence, 100)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(self.apply_order_changes(sequence, changes),
+            [1, 2, 4, 3, 5])
+
+    def test_sparse_order_descending(self):
+        sequence = [(1, 100), (5, 500), (4, 400), (3, 300), (2, 200)]
+        self.assertEqual(
+            get_sparse_order(sequence, 100, descending=True), {1: 600})
+
+    def test_sparse_order_rebalances_exhausted_gap(self):
+        sequence = [(1, 1), (3, 3), (2, 2), (4, 4)]
+        changes = get_sparse_order(sequence, 100)
+
+        self.assertEqual(self.apply_order_changes(sequence, changes),
+            [1, 3, 2, 4])
+        self.assertTrue(len(changes) < len(sequence))
+        self.assertTrue(all(order >= 1 for order in changes.values()))
+
+    def test_adminsortable_sparse_sorting_updates_moved_object(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+
+        with mock.patch.object(Category, 'order_gap', 100):
+            category1, category2, category3 = self.make_test_categories()
+
+            response = self.client.post(self.get_sorting_url(Category),
+                data=self.get_category_indexes(category3, category1, category2),
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        content = json.loads(response.content.decode(encoding='UTF-8'))
+        self.assertTrue(content.get('objects_sorted'),
+            'Objects should have been sorted.')
+        # the new values stay within those of the posted objects
+        self.assertEqual(
+            list(Category.objects.values_list('pk', 'order')),
+            [(category3.pk, 132), (category1.pk, 165), (category2.pk, 200)])
+
+    def test_adminsortable_sparse_sorting_of_part_of_a_group(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+
+        with mock.patch.object(Category, 'order_gap', 100):
+            categories = [self.create_category(title='Category {0}'.format(
+                i)) for i in range(6)]
+            posted = [categories[4], categories[2], categories[3]]
+            response = self.client.post(self.get_sorting_url(Category),
+                data=self.get_category_indexes(*posted),
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        self.assertEqual(response.status_code, httplib.OK)
+        self.assertEqual(list(Category.objects.values_list('pk', flat=True)),
+            [category.pk for category in categories[:2] + posted
+                + categories[5:]])
+        orders = list(Category.objects.values_list('order', flat=True))
+        self.assertEqual(len(set(orders)), 6)
+        self.assertTrue(all(300 <= order <= 500 for order in orders[2:5]))
+
+    def move_category(self, moved, after=None, before=None, url=None):
+        data = {'moved': moved.pk}
+        if after is not None:
+            data['after'] = after.pk
+        if before is not None:
+            data['before'] = before.pk
+        return self.client.post(url or self.get_sorting_url(Category),
+            data=data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_adminsortable_move_after(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+
+        response = self.move_category(category1, after=category3)
+        content = json.loads(response.content.decode(encoding='UTF-8'))
+        self.assertTrue(content.get('objects_sorted'),
+            'Objects should have been sorted.')
+        self.assertEqual(
+            list(Category.objects.values_list('pk', 'order')),
+            [(category2.pk, 1), (category3.pk, 2), (category1.pk, 3)])
+
+    def test_adminsortable_move_before(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        category4 = self.create_category(title='Category 4')
+
+        self.move_category(category3, before=category1)
+        self.assertEqual(
+            list(Category.objects.values_list('pk', 'order')),
+            [(category3.pk, 1), (category1.pk, 2), (category2.pk, 3),
+             (category4.pk, 4)])
+
+    def test_adminsortable_sparse_move_writes_moved_object(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+
+        with mock.patch.object(Category, 'order_gap', 100):
+            category1, category2, category3 = self.make_test_categories()
+            self.move_category(category3, after=category1)
+
+        self.assertEqual(
+            list(Category.objects.values_list('pk', 'order')),
+            [(category1.pk, 100), (category3.pk, 150), (category2.pk, 200)])
+
+    def test_adminsortable_sparse_move_rebalances_exhausted_gap(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+
+        with mock.patch.object(Category, 'order_gap', 2):
+            category1, category2, category3 = self.make_test_categories()
+            self.move_category(category3, after=category1)
+            self.move_category(category2, after=category1)
+
+        self.assertEqual(list(Category.objects.values_list('pk', flat=True)),
+            [category1.pk, category2.pk, category3.pk])
+        orders = list(Category.objects.values_list('order', flat=True))
+        self.assertEqual(len(set(orders)), 3)
+
+    def test_adminsortable_move_rejects_other_group(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        project1 = Project.objects.create(category=category1,
+            description='foo')
+        project2 = Project.objects.create(category=category2,
+            description='bar')
+
+        response = self.move_category(project1, after=project2,
+            url=self.get_sorting_url(Project))
+        self.assertEqual(response.status_code, httplib.BAD_REQUEST)
+
+    def test_adminsortable_sorting_with_sort_filter(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+
+        response = self.client.post(
+            '/admin/samples/person/sort/do-sorting/{0}/?sort_filter=0'.format(
+                Person.model_type_id()),
+            data={'indexes': ','.join(str(person.pk) for person in (
+                self.fourth_person, self.first_person, self.third_person))},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        content = json.loads(response.content.decode(encoding='UTF-8'))
+        self.assertTrue(content.get('objects_sorted'),
+            'Objects should have been sorted.')
+        self.assertEqual(
+            list(Person.objects.filter(is_board_member=True).values_list(
+                'pk', flat=True)),
+            [self.fourth_person.pk, self.first_person.pk,
+             self.third_person.pk])
+
+    def test_adminsortable_sort_view_paginated(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        categories = [self.create_category(title='Category {0}'.format(i))
+            for i in range(5)]
+
+        category_admin = admin.site._registry[Category]
+        with mock.patch.object(category_admin, 'sort_view_per_page', 2), \
+                mock.patch.object(category_admin,
+                    'sort_view_paginate_threshold', 4):
+            response = self.client.get('/admin/samples/category/sort/?p=2')
+
+        self.assertEqual(response.status_code, httplib.OK)
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(list(response.context['objects']), categories[2:4])
+        self.assertEqual(response.context['previous_page_pk'],
+            categories[1].pk)
+        self.assertEqual(response.context['next_page_pk'], categories[4].pk)
+        self.assertContains(response, 'page-target-previous')
+
+    def test_adminsortable_sort_view_not_paginated_below_threshold(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        self.make_test_categories()
+
+        category_admin = admin.site._registry[Category]
+        with mock.patch.object(category_admin, 'sort_view_per_page', 2), \
+                mock.patch.object(category_admin,
+                    'sort_view_paginate_threshold', 4):
+            response = self.client.get('/admin/samples/category/sort/')
+
+        self.assertIsNone(response.context['page_obj'])
+        self.assertEqual(len(response.context['objects']), 3)
+
+    def test_sortable_options_computed_once_per_class(self):
+        options = get_sortable_options(Project)
+        self.assertIs(get_sortable_options(Project), options)
+        self.assertEqual(options.order_field_name, 'order')
+        self.assertEqual(options.sortable_foreign_key.name, 'category')
+
+        # set on the class when it is prepared, without an instance
+        self.assertEqual(Project.sortable_foreign_key.name, 'category')
+        self.assertIsNone(Category.sortable_foreign_key)
+
+    def test_sortable_options_system_checks(self):
+        self.assertEqual(get_sortable_options(Category).check(), [])
+
+        class MissingOrderingModel(SortableMixin):
+            class Meta:
+                app_label = 'samples'
+
+        self.assertEqual([error.id for error in MissingOrderingModel.check()],
+            ['adminsortable.E001'])
+        with self.assertRaises(ValueError):
+            MissingOrderingModel().save()
+
+    @requires_on_commit_capture
+    def test_adminsortable_sort_view_cached(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        category_admin = admin.site._registry[Category]
+        category_admin.connect_version_signals(Category)
+        self.addCleanup(post_reorder.disconnect, sender=Category,
+            dispatch_uid='adminsortable_version_samples.category')
+        sort_url = '/admin/samples/category/sort/'
+
+        def get_sort_view():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(sort_url)
+            queried = any('samples_category' in query['sql']
+                for query in context.captured_queries)
+            return response, queried
+
+        with mock.patch.object(category_admin, 'sort_view_cache_timeout', 60):
+            response, queried = get_sort_view()
+            self.assertTrue(queried)
+            self.assertNotIn('csrfmiddlewaretoken',
+                response.context['sortable_list'])
+
+            response, queried = get_sort_view()
+            self.assertFalse(queried)
+            self.assertContains(response, 'Category 3')
+
+            # sorting invalidates the cached list
+            with self.captureOnCommitCallbacks(execute=True):
+                self.move_category(category3, before=category1,
+                    url='/admin/samples/category/sort/do-sorting/{0}/'.format(
+                        Category.model_type_id()))
+            response, queried = get_sort_view()
+            self.assertTrue(queried)
+            self.assertEqual(list(response.context['objects']),
+                [category3, category1, category2])
+
+            # and so does saving an object
+            category1.title = 'Renamed'
+            category1.save()
+            response, queried = get_sort_view()
+            self.assertTrue(queried)
+            self.assertContains(response, 'Renamed')
+
+            # and so does moving an object from code
+            with self.captureOnCommitCallbacks(execute=True):
+                move_object(Category.objects.all(), category2.pk,
+                    before=category3.pk)
+            response, queried = get_sort_view()
+            self.assertTrue(queried)
+            self.assertEqual(list(response.context['objects']),
+                list(Category.objects.all()))
+            self.assertEqual(response.context['objects'][0], category2)
+
+    def test_sortable_compact(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        projects = [Project.objects.create(category=category, order=order,
+                description='foo')
+            for category, order in ((category1, 7), (category2, 3),
+                (category1, 4), (category1, 7), (category2, 40))]
+
+        out = StringIO()
+        call_command('sortable_compact', 'samples.Project', stdout=out)
+
+        self.assertEqual(out.getvalue(),
+            'samples.Project: renumbered 5 of 5 rows.\n')
+        self.assertEqual(
+            [Project.objects.get(pk=project.pk).order for project in projects],
+            [2, 1, 1, 3, 2])
+
+    def test_sortable_compact_dry_run_and_gap(self):
+        for order in (5, 9, 10):
+            Category.objects.create(title='Category', order=order)
+
+        out = StringIO()
+        call_command('sortable_compact', 'samples.Category', dry_run=True,
+            stdout=out)
+        self.assertIn('3 of 3 rows would be renumbered', out.getvalue())
+        self.assertEqual(list(Category.objects.values_list('order',
+            flat=True)), [5, 9, 10])
+
+        call_command('sortable_compact', 'samples.Category', gap=10,
+            batch_size=2, stdout=StringIO())
+        self.assertEqual(list(Category.objects.values_list('order',
+            flat=True)), [10, 20, 30])
+
+    def test_sortable_compact_leaves_concurrently_moved_groups_alone(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        category3 = self.create_category(title='Category 3')
+
+        # the second statement finds a row that was moved meanwhile
+        writes = []
+
+        def flaky_write_order(queryset, order_field_name, changes,
+                expected=None):
+            writes.append(changes)
+            if len(writes) == 2:
+                return 0
+            return write_order(queryset, order_field_name, changes,
+                expected=expected)
+
+        out, err = StringIO(), StringIO()
+        with mock.patch('adminsortable.management.commands.sortable_compact'
+                '.write_order', flaky_write_order):
+            call_command('sortable_compact', 'samples.Category', gap=1024,
+                batch_size=1, stdout=out, stderr=err)
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(list(Category.objects.values_list('pk', 'order')),
+            [(category1.pk, 1), (category2.pk, 2), (category3.pk, 3)])
+        self.assertIn('3 rows were left alone', err.getvalue())
+
+        call_command('sortable_compact', 'samples.Category', gap=1024,
+            batch_size=1, stdout=StringIO())
+        self.assertEqual(list(Category.objects.values_list('pk', 'order')),
+            [(category1.pk, 1024), (category2.pk, 2048),
+             (category3.pk, 3072)])
+
+    def test_sortable_compact_skips_concurrently_moved_rows(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        Category.objects.filter(pk=category2.pk).update(order=5)
+
+        self.assertEqual(write_order(Category.objects.all(), 'order',
+            {category1.pk: 10, category2.pk: 20},
+            expected={category1.pk: 1, category2.pk: 2}), 1)
+        self.assertEqual(Category.objects.get(pk=category2.pk).order, 5)
+
+    def test_sortable_check(self):
+        category1 = self.create_category()
+        category2 = self.create_category(title='Category 2')
+        for category, order in ((category1, 1), (category1, 1),
+                (category1, 5), (category2, 1)):
+            Project.objects.create(category=category, order=order,
+                description='foo')
+
+        out = StringIO()
+        call_command('sortable_check', 'samples.Project', json=True,
+            stdout=out)
+        results = json.loads(out.getvalue())
+
+        self.assertFalse(results['ok'])
+        result = results['models'][0]
+        self.assertEqual((result['rows'], result['groups'],
+            result['duplicates'], result['gaps']), (4, 2, 1, 1))
+        self.assertEqual(result['examples']['duplicates'][0]['group'],
+            {'category_id': category1.pk})
+
+        with self.assertRaises(CommandError):
+            call_command('sortable_check', 'samples.Project', fail=True,
+                stdout=StringIO())
+        call_command('sortable_check', 'samples.Category', fail=True,
+            stdout=StringIO())
+
+    @requires_on_commit_capture
+    def test_reorder_signals_carry_changes(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        sent = []
+
+        def receiver(signal, sender, group, changes, using, **kwargs):
+            sent.append((signal, sender, group, sorted(changes)))
+
+        pre_reorder.connect(receiver)
+        post_reorder.connect(receiver)
+        try:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.move_category(category1, after=category2)
+                self.assertEqual([signal for signal, sender, group, changes
+                    in sent], [pre_reorder])
+            # post_reorder, and setting the new order version
+            self.assertEqual(len(callbacks), 2)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(self.get_sorting_url(Category),
+                    data=self.get_category_indexes(category3, category2,
+                        category1),
+                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        finally:
+            pre_reorder.disconnect(receiver)
+            post_reorder.disconnect(receiver)
+
+        moved = [(category1.pk, 1, 2), (category2.pk, 2, 1)]
+        sorted_ = [(category1.pk, 2, 3), (category2.pk, 1, 2),
+            (category3.pk, 3, 1)]
+        self.assertEqual(sent, [
+            (pre_reorder, Category, {}, moved),
+            (post_reorder, Category, {}, moved),
+            (pre_reorder, Category, {}, sorted_),
+            (post_reorder, Category, {}, sorted_),
+        ])
+
+    @requires_on_commit_capture
+    def test_reorder_signals_grouped(self):
+        category = self.create_category()
+        project1 = Project.objects.create(category=category,
+            description='foo')
+        project2 = Project.objects.create(category=category,
+            description='bar')
+        sent = []
+
+        def receiver(sender, group, changes, **kwargs):
+            sent.append((group, sorted(changes)))
+
+        post_reorder.connect(receiver, sender=Project)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                move_object(Project.objects.all(), project2.pk,
+                    before=project1.pk)
+        finally:
+            post_reorder.disconnect(receiver, sender=Project)
+
+        self.assertEqual(sent, [({'category_id': category.pk},
+            [(project1.pk, 1, 2), (project2.pk, 2, 1)])])
+
+    def test_adminsortable_server_timing(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        category_admin = admin.site._registry[Category]
+
+        response = self.client.get('/admin/samples/category/sort/')
+        self.assertNotIn('Server-Timing', response)
+
+        with mock.patch.object(category_admin, 'sortable_timing', True):
+            with self.assertLogs('adminsortable', 'INFO'):
+                response = self.client.get('/admin/samples/category/sort/')
+            self.assertRegex(response['Server-Timing'],
+                r'^queryset;dur=[\d.]+;desc="\d+ queries", render;.*total;')
+
+            response = self.client.get('/admin/samples/category/')
+            self.assertIn('changelist;dur=', response['Server-Timing'])
+            self.assertIn('render;dur=', response['Server-Timing'])
+
+            response = self.move_category(category3, before=category1,
+                url='/admin/samples/category/sort/do-sorting/{0}/'.format(
+                    Category.model_type_id()))
+            self.assertIn('write;dur=', response['Server-Timing'])
+
+    def test_adminsortable_query_budget(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        self.make_test_categories()
+        category_admin = admin.site._registry[Category]
+
+        with mock.patch.object(category_admin, 'sortable_query_budget', 0):
+            with self.assertLogs('adminsortable', 'WARNING') as logs:
+                response = self.client.get('/admin/samples/category/sort/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('exceeds the query budget of 0 queries', logs.output[0])
+
+    @skipUnless(django.VERSION >= (4, 1),
+        '`sortable_async_views` requires Django 4.1 or higher.')
+    def test_adminsortable_async_views(self):
+        category1, category2, category3 = self.make_test_categories()
+        category_admin = SortableAdmin(Category, admin.site)
+        sort_view = category_admin.async_admin_view(
+            category_admin.async_sort_view)
+        do_sorting_view = category_admin.async_admin_view(
+            category_admin.async_do_sorting_view)
+        factory = AsyncRequestFactory()
+        user = User.objects.get(pk=self.user.pk)
+        sort_url = '/admin/samples/category/sort/'
+        sorting_url = '/admin/samples/category/sort/do-sorting/{0}/'.format(
+            Category.model_type_id())
+
+        request = factory.get(sort_url)
+        request.user = AnonymousUser()
+        response = async_to_sync(sort_view)(request)
+        self.assertEqual(response.status_code, httplib.FOUND)
+
+        request = factory.get(sort_url)
+        request.user = user
+        response = async_to_sync(sort_view)(request)
+        self.assertContains(response, 'Category 3')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        request = factory.get(sorting_url)
+        request.user = user
+        response = async_to_sync(do_sorting_view)(request,
+            model_type_id=Category.model_type_id())
+        self.assertEqual(response.status_code, httplib.METHOD_NOT_ALLOWED)
+
+        # posts without a CSRF token are refused
+        request = factory.post(sorting_url,
+            {'moved': category3.pk, 'before': category1.pk},
+            headers={'X-Requested-With': 'XMLHttpRequest'})
+        request.user = user
+        response = async_to_sync(do_sorting_view)(request,
+            model_type_id=Category.model_type_id())
+        self.assertEqual(response.status_code, httplib.FORBIDDEN)
+
+        request = factory.post(sorting_url,
+            {'moved': category3.pk, 'before': category1.pk},
+            headers={'X-Requested-With': 'XMLHttpRequest'})
+        request.user = user
+        request._dont_enforce_csrf_checks = True
+        response = async_to_sync(do_sorting_view)(request,
+            model_type_id=Category.model_type_id())
+        content = json.loads(response.content.decode(encoding='UTF-8'))
+        self.assertTrue(content.get('objects_sorted'),
+            'Objects should have been sorted.')
+        self.assertEqual(list(Category.objects.values_list('pk', flat=True)),
+            [category3.pk, category1.pk, category2.pk])
+
+    def post_reorders(self, *reorders):
+        return self.client.post('/admin/samples/project/sort/do-sorting/batch/',
+            data=json.dumps({'reorders': list(reorders)}),
+            content_type='application/json')
+
+    def test_adminsortable_batch_sorting(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        project1 = Project.objects.create(category=category1,
+            description='foo')
+        project2 = Project.objects.create(category=category1,
+            description='bar')
+
+        response = self.client.get('/admin/samples/project/sort/')
+        self.assertContains(response,
+            'data-batch-url="/admin/samples/project/sort/do-sorting/batch/"')
+        self.assertContains(response, 'data-model-type-id="{0}"'.format(
+            Category.model_type_id()))
+
+        response = self.post_reorders(
+            {'model_type_id': Category.model_type_id(),
+             'indexes': [category3.pk, category1.pk, category2.pk]},
+            {'model_type_id': Project.model_type_id(),
+             'moved': project2.pk, 'before': project1.pk})
+        content = json.loads(response.content.decode(encoding='UTF-8'))
+        self.assertTrue(content.get('objects_sorted'),
+            'Objects should have been sorted.')
+        self.assertEqual(list(Category.objects.values_list('pk', flat=True)),
+            [category3.pk, category1.pk, category2.pk])
+        self.assertEqual(list(Project.objects.values_list('pk', flat=True)),
+            [project2.pk, project1.pk])
+
+    @requires_on_commit_capture
+    def test_adminsortable_optimistic_batch_sorting(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        project1, project2, project3 = [Project.objects.create(
+            category=category1, description=str(i)) for i in range(3)]
+        project_admin = admin.site._registry[Project]
+        version = get_order_version(Project, {'category_id': category1.pk})
+
+        with mock.patch.object(project_admin, 'sort_view_optimistic', True):
+            # only the first move of the list is posted with its version
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post_reorders(
+                    {'model_type_id': Project.model_type_id(),
+                     'moved': project3.pk, 'before': project1.pk,
+                     'version': version},
+                    {'model_type_id': Project.model_type_id(),
+                     'moved': project2.pk, 'before': project3.pk})
+            content = json.loads(response.content.decode(encoding='UTF-8'))
+            self.assertTrue(content.get('objects_sorted'),
+                'Objects should have been sorted.')
+            self.assertEqual(len(set(content['versions'])), 1)
+            self.assertNotIn(None, content['versions'])
+
+            # the next move is posted with the version of the last one
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post_reorders(
+                    {'model_type_id': Project.model_type_id(),
+                     'moved': project1.pk, 'before': project2.pk,
+                     'version': content['versions'][-1]})
+            self.assertEqual(response.status_code, httplib.OK)
+        self.assertEqual(list(Project.objects.values_list('pk', flat=True)),
+            [project1.pk, project2.pk, project3.pk])
+
+    def test_adminsortable_batch_sorting_is_atomic(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+
+        response = self.post_reorders(
+            {'model_type_id': Category.model_type_id(),
+             'indexes': [category3.pk, category1.pk, category2.pk]},
+            {'model_type_id': Category.model_type_id(),
+             'moved': category1.pk, 'after': 0})
+        self.assertEqual(response.status_code, httplib.BAD_REQUEST)
+        self.assertEqual(list(Category.objects.values_list('pk', flat=True)),
+            [category1.pk, category2.pk, category3.pk])
+
+        response = self.post_reorders({'indexes': [category1.pk]})
+        self.assertEqual(response.status_code, httplib.BAD_REQUEST)
+
+    def test_adminsortable_batch_sorting_checks_models(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+
+        response = self.post_reorders(
+            {'model_type_id': Person.model_type_id(),
+             'indexes': [self.second_person.pk, self.first_person.pk]})
+        self.assertEqual(response.status_code, httplib.FORBIDDEN)
+
+    @requires_on_commit_capture
+    def test_adminsortable_optimistic_sorting(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        category_admin = admin.site._registry[Category]
+        sorting_url = '/admin/samples/category/sort/do-sorting/{0}/'.format(
+            Category.model_type_id())
+        version = get_order_version(Category)
+
+        with mock.patch.object(category_admin, 'sort_view_optimistic', True):
+            response = self.client.get('/admin/samples/category/sort/')
+            self.assertContains(response, 'data-version="{0}"'.format(version))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(sorting_url, data={
+                    'moved': category3.pk, 'before': category1.pk,
+                    'version': version},
+                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            content = json.loads(response.content.decode(encoding='UTF-8'))
+            self.assertTrue(content.get('objects_sorted'),
+                'Objects should have been sorted.')
+            self.assertNotEqual(content['version'], version)
+            self.assertEqual(content['version'], get_order_version(Category))
+
+            # the list the version was read from has changed since
+            response = self.client.post(sorting_url, data={
+                'moved': category1.pk, 'after': category2.pk,
+                'version': version}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(response.status_code, httplib.CONFLICT)
+            content = json.loads(response.content.decode(encoding='UTF-8'))
+            self.assertEqual(content['order'], [str(category3.pk),
+                str(category1.pk), str(category2.pk)])
+            self.assertEqual(content['version'], get_order_version(Category))
+            self.assertEqual(list(Category.objects.values_list('pk',
+                flat=True)), [category3.pk, category1.pk, category2.pk])
+
+    @requires_on_commit_capture
+    def test_move_bumps_order_version_of_its_group(self):
+        category1, category2, category3 = self.make_test_categories()
+        project1 = Project.objects.create(category=category1, title='1')
+        project2 = Project.objects.create(category=category1, title='2')
+        Project.objects.create(category=category2, title='3')
+        version1 = get_order_version(Project, {'category_id': category1.pk})
+        version2 = get_order_version(Project, {'category_id': category2.pk})
+        self.assertEqual(version1, get_order_version(Project,
+            {'category_id': str(category1.pk)}))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            move_object(Project.objects.all(), project1.pk,
+                after=project2.pk)
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(get_order_version(Project,
+            {'category_id': category1.pk}), version1)
+        self.assertEqual(get_order_version(Project,
+            {'category_id': category2.pk}), version2)
+
+    def test_sorting_retried_while_rows_are_locked(self):
+        category1, category2, category3 = self.make_test_categories()
+        attempts = []
+
+        def reorder():
+            attempts.append(1)
+            raise OperationalError('could not obtain lock')
+
+        with mock.patch('adminsortable.ordering.time.sleep') as sleep:
+            with self.assertRaises(ReorderConflict):
+                retry_on_lock_failure(reorder, retries=2)
+        self.assertEqual((len(attempts), sleep.call_count), (3, 2))
+
+    def test_sorting_not_retried_on_other_database_errors(self):
+        attempts = []
+
+        def reorder():
+            attempts.append(1)
+            raise OperationalError('no such column: order')
+
+        with mock.patch('adminsortable.ordering.time.sleep') as sleep:
+            with self.assertRaises(OperationalError):
+                retry_on_lock_failure(reorder, retries=2)
+        self.assertEqual((len(attempts), sleep.call_count), (1, 0))
+
+    def test_order_writers(self):
+        category1, category2, category3 = self.make_test_categories()
+        categories = Category.objects.all()
+        self.assertIs(get_order_writer(categories.db), write_order_values)
+        with self.settings(ADMINSORTABLE_ORDER_WRITER=
+                'adminsortable.ordering.write_order_case'):
+            self.assertIs(get_order_writer(categories.db), write_order_case)
+
+        for writer in (write_order_values, write_order_case):
+            with CaptureQueriesContext(connection) as queries:
+                updated = writer(categories, 'order', {category1.pk: 3,
+                    category2.pk: 1, category3.pk: 2})
+            self.assertEqual((updated, len(queries)), (3, 1))
+            self.assertEqual(list(categories.values_list('pk', flat=True)),
+                [category2.pk, category3.pk, category1.pk])
+
+            # rows whose order changed since they were read are left alone
+            updated = writer(categories, 'order', {category1.pk: 1,
+                category2.pk: 2, category3.pk: 3}, expected={category1.pk: 3,
+                category2.pk: 1, category3.pk: 1})
+            self.assertEqual(updated, 2)
+            self.assertEqual(dict(categories.values_list('pk', 'order')),
+                {category1.pk: 1, category2.pk: 2, category3.pk: 2})
+
+            # large reorders are written in chunks within the parameter limit
+            with mock.patch.object(connection.features, 'max_query_params',
+                    4), CaptureQueriesContext(connection) as queries:
+                updated = writer(categories, 'order', {category1.pk: 3,
+                    category2.pk: 1, category3.pk: 2})
+            self.assertEqual(updated, 3)
+            self.assertGreater(len(queries), 1)
+            self.assertEqual(list(categories.values_list('pk', flat=True)),
+                [category2.pk, category3.pk, category1.pk])
+
+    def test_adminsortable_sorting_does_not_instantiate_objects(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        instances = []
+
+        def count_instance(sender, **kwargs):
+            instances.append(sender)
+
+        models.signals.pre_init.connect(count_instance, sender=Category)
+        try:
+            response = self.client.post(self.get_sorting_url(Category),
+                data=self.get_category_indexes(category3, category1,
+                    category2), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        finally:
+            models.signals.pre_init.disconnect(count_instance,
+                sender=Category)
+
+        content = json.loads(response.content.decode(encoding='UTF-8'))
+        self.assertTrue(content.get('objects_sorted'),
+            'Objects should have been sorted.')
+        self.assertEqual(instances, [])
+        self.assertEqual(list(Category.objects.values_list('pk', flat=True)),
+            [category3.pk, category1.pk, category2.pk])
+
+    def test_adminsortable_coalesced_moves(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        category4 = self.create_category(title='Category 4')
+
+        response = self.client.get('/admin/samples/category/sort/')
+        self.assertContains(response,
+            'data-batch-url="/admin/samples/category/sort/do-sorting/batch/"')
+        self.assertContains(response, 'data-model-type-id="{0}"'.format(
+            Category.model_type_id()))
+
+        # 4 was dragged to the top and 1 below 3 while a request was in
+        # flight: each is moved after the object now shown before it
+        response = self.client.post(
+            '/admin/samples/category/sort/do-sorting/batch/',
+            data=json.dumps({'reorders': [
+                {'model_type_id': Category.model_type_id(),
+                 'moved': category4.pk, 'before': category2.pk},
+                {'model_type_id': Category.model_type_id(),
+                 'moved': category1.pk, 'after': category3.pk},
+            ]}), content_type='application/json')
+        content = json.loads(response.content.decode(encoding='UTF-8'))
+        self.assertTrue(content.get('objects_sorted'),
+            'Objects should have been sorted.')
+        self.assertEqual(list(Category.objects.values_list('pk', flat=True)),
+            [category4.pk, category2.pk, category3.pk, category1.pk])
+
+    def test_adminsortable_lazy_children(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        Project.objects.create(category=category1, title='Lazy project 1',
+            description='foo')
+        Project.objects.create(category=category1, title='Lazy project 2',
+            description='bar')
+        Project.objects.create(category=category2, title='Lazy project 3',
+            description='baz')
+        project_admin = admin.site._registry[Project]
+
+        with self.assertNumQueries(1):
+            parents = [(parent, parent.sortable_children_count) for parent in
+                project_admin.get_sort_view_parents(Project.objects.all())]
+        self.assertEqual(parents, [(category1, 2), (category2, 1)])
+
+        with mock.patch.object(project_admin, 'sort_view_lazy_children',
+                True):
+            response = self.client.get('/admin/samples/project/sort/')
+            self.assertContains(response,
+                'data-children-url="/admin/samples/project/sort/children/"')
+            self.assertContains(response, 'data-parent="{0}"'.format(
+                category1.pk))
+            self.assertNotContains(response, 'data-parent="{0}"'.format(
+                category3.pk))
+            self.assertNotContains(response, 'Lazy project')
+
+            response = self.client.get('/admin/samples/project/sort/children/',
+                {'_parent': category1.pk})
+            content = json.loads(response.content.decode(encoding='UTF-8'))
+            self.assertIn('Lazy project 1', content['html'])
+            self.assertIn('Lazy project 2', content['html'])
+            self.assertNotIn('Lazy project 3', content['html'])
+            self.assertLess(content['html'].index('Lazy project 1'),
+                content['html'].index('Lazy project 2'))
+            self.assertIsNone(content['version'])
+
+            with mock.patch.object(project_admin, 'sort_view_optimistic',
+                    True):
+                response = self.client.get(
+                    '/admin/samples/project/sort/children/',
+                    {'_parent': category1.pk})
+            content = json.loads(response.content.decode(encoding='UTF-8'))
+            self.assertEqual(content['version'], get_order_version(Project,
+                {'category_id': category1.pk}))
+
+            response = self.client.get('/admin/samples/project/sort/children/',
+                {'_parent': 'foo'})
+            self.assertEqual(response.status_code, httplib.BAD_REQUEST)
+
+    def test_adminsortable_compact_sort_view(self):
+        self.client.login(username=self.user.username,
+            password=self.user_raw_password)
+        category1, category2, category3 = self.make_test_categories()
+        Project.objects.create(category=category1, description='foo')
+        Project.objects.create(category=category1, description='bar')
+        sorting_url = '/admin/samples/category/sort/do-sorting/{0}/'.format(
+            Category.model_type_id())
+        category_admin = admin.site._registry[Category]
+        project_admin = admin.site._registry[Project]
+
+        full_response = self.client.get('/admin/samples/category/sort/')
+        with mock.patch.object(category_admin, 'sort_view_compact', True):
+            response = self.client.get('/admin/samples/category/sort/')
+        self.assertContains(response,
+            'data-sorting-url="{0}"'.format(sorting_url), count=1)
+        for category in (category1, category2, category3):
+            self.assertContains(response, 'data-pk="{0}"'.format(category.pk))
+        self.assertNotContains(response, '<input name="pk"')
+        # only the CSRF token of the page is left, not one per object
+        self.assertEqual(
+            response.content.count(b'name="csrfmiddlewaretoken"'),
+            full_response.content.count(b'name="csrfmiddlewaretoken"') - 3)
+        self.assertLess(len(response.content), len(full_response.content))
+
+        with mock.patch.object(project_admin, 'sort_view_compact', True):
+            response = self.client.get('/admin/samples/project/sort/')
+        self.assertContains(response, 'data-sorting-url="/admin/samples/'
+            'project/sort/do-sorting/{0}/"'.format(Category.model_type_id()),
+            count=1)
+        self.assertContains(response, 'data-pk="{0}"'.format(category1.pk))
+        self.assertNotContains(response, '<input name="pk"')
+
+    def test_move_locks_shifted_rows_in_pk_order(self):
+        category1, category2, category3 = self.make_test_categories()
+
+        with CaptureQueriesContext(connection) as queries:
+            move_object(Category.objects.all(), category3.pk,
+                before=category1.pk, nowait=True)
+
+        shifted = [query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and '>=' in query['sql']]
+        self.assertEqual(len(shifted), 1)
+        self.assertTrue(shifted[0].endswith(
+            'ORDER BY "samples_category"."id" ASC'), shifted[0])
+
+    def test_move_guards_both_neighbours(self):
+        with mock.patch.object(Category, 'order_gap', 100):
+            category1, category2, category3 = self.make_test_categories()
+            category4 = self.create_category(title='Category 4')
+
+            with mock.patch('adminsortable.ordering._lock_neighbour',
+                    wraps=ordering._lock_neighbour) as lock_neighbour:
+                move_object(Category.objects.all(), category4.pk,
+                    after=category2.pk, nowait=True)
+            self.assertEqual(lock_neighbour.call_args[1], {'nowait': True})
+            self.assertEqual(Category.objects.get(pk=category4.pk).order, 250)
+
+            # another optimistic move was placed between the same
+            # neighbours while this one was computed
+            original_move_sparse = ordering._move_sparse
+
+            def move_sparse(*args):
+                changes = original_move_sparse(*args)
+                Category.objects.filter(pk=category3.pk).update(order=150)
+                return changes
+
+            with mock.patch('adminsortable.ordering._move_sparse',
+                    move_sparse), self.assertRaises(ReorderConflict):
+                move_object(Category.objects.all(), category4.pk,
+                    after=category1.pk,
+                    version=get_order_version(Category))
+        self.assertEqual(Category.objects.get(pk=category4.pk).order, 250)